@@ -0,0 +1,191 @@
+"""
+Time the Gmail fetch path against a local fake Gmail server.
+
+  python bench_gmail.py                          # 25 messages, 80 ms per round trip
+  python bench_gmail.py --limit 30 --rtt-ms 150 --fail-every 7
+  python bench_gmail.py --modes batch threads --json > gmail.json
+
+_gmail_fetch_messages (messages.list, then messages.get for each id) runs in
+every GMAIL_FETCH_MODE against a stub of the Gmail API on 127.0.0.1. The stub
+serves list, get and the multipart /batch/gmail/v1 endpoint, adds --rtt-ms to
+every HTTP request it receives (a batch counts once) and answers 404 for every
+--fail-every'th message, so skip-on-error is exercised too. No Google account
+or token.json is needed.
+
+Reported per mode:
+  ms_p50 / ms_p95   wall time for one fetch (list + gets)
+  round_trips       HTTP requests the server saw per fetch
+  messages          messages returned (failed ones are skipped)
+  same_as_seq       returned the same messages, in the same order, as sequential
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+os.environ.setdefault("HISTORY_DB_PATH", "")
+import fastROUT as fr
+from google.oauth2.credentials import Credentials
+
+
+def _message(msg_id, fmt):
+    headers = [{"name": "From", "value": f"sender{int(msg_id) % 5}@example.com"},
+               {"name": "Subject", "value": f"Message {msg_id}"},
+               {"name": "Date", "value": "Mon, 5 Oct 2026 09:00:00 +0000"}]
+    msg = {"id": msg_id, "threadId": f"t{msg_id}", "snippet": f"snippet {msg_id}",
+           "payload": {"mimeType": "text/plain", "headers": headers}}
+    if fmt == "full":
+        body = (f"Body of message {msg_id}. " * 40).encode()
+        msg["payload"]["body"] = {"size": len(body), "data": base64.urlsafe_b64encode(body).decode()}
+    return msg
+
+
+class FakeGmail(BaseHTTPRequestHandler):
+    """messages.list, messages.get and the batch endpoint of the Gmail API."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    rtt_s = 0.08
+    fail_every = 0
+    total = 30
+    requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _count(self):
+        with FakeGmail.lock:
+            FakeGmail.requests += 1
+        time.sleep(self.rtt_s)
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, path_qs):
+        """(status, json) for one GET, as the real API would answer it."""
+        url = urlsplit(path_qs)
+        query = parse_qs(url.query)
+        prefix = "/gmail/v1/users/me/messages"
+        if url.path == prefix:
+            n = min(int(query.get("maxResults", ["100"])[0]), self.total)
+            return 200, {"messages": [{"id": str(i), "threadId": f"t{i}"} for i in range(1, n + 1)]}
+        if url.path.startswith(prefix + "/"):
+            msg_id = url.path[len(prefix) + 1:]
+            if self.fail_every and int(msg_id) % self.fail_every == 0:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            return 200, _message(msg_id, query.get("format", ["full"])[0])
+        return 404, {"error": {"code": 404, "message": "unknown path"}}
+
+    def do_GET(self):
+        self._count()
+        status, body = self._route(self.path)
+        self._send(status, body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not self.path.startswith("/batch/"):
+            self._send(404, {"error": {"code": 404}})
+            return
+        self._count()
+        raw = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body
+        parts = BytesParser(policy=HTTP).parsebytes(raw).iter_parts()
+        boundary = "batch_fake_gmail"
+        out = []
+        for part in parts:
+            inner = part.get_payload(decode=True) or part.get_payload().encode()
+            request_line = inner.split(b"\r\n", 1)[0].decode()
+            status, payload = self._route(request_line.split(" ")[1])
+            reason = "OK" if status == 200 else "Not Found"
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n")
+        out.append(f"--{boundary}--\r\n")
+        self._send(200, "".join(out).encode(), f"multipart/mixed; boundary={boundary}")
+
+
+def start_fake_gmail(rtt_ms, fail_every):
+    FakeGmail.rtt_s = rtt_ms / 1000.0
+    FakeGmail.fail_every = fail_every
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGmail)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _pct(xs, q):
+    return float(np.percentile(xs, q)) if len(xs) else float("nan")
+
+
+def run(args):
+    server = start_fake_gmail(args.rtt_ms, args.fail_every)
+    fr.GMAIL_API_ENDPOINT = f"http://127.0.0.1:{server.server_address[1]}"
+    fr._GMAIL_CREDS = Credentials(token="bench")  # no expiry: never refreshed
+    fr._gmail_service()
+
+    rows, baseline = [], None
+    for mode in args.modes:
+        fr.GMAIL_FETCH_MODE = mode
+        fr._gmail_fetch_messages("in:inbox", args.limit)  # warm connections
+        times, trips = [], []
+        for _ in range(args.repeat):
+            before = FakeGmail.requests
+            t0 = time.perf_counter()
+            msgs = fr._gmail_fetch_messages("in:inbox", args.limit)
+            times.append((time.perf_counter() - t0) * 1000.0)
+            trips.append(FakeGmail.requests - before)
+        ids = [m["id"] for m in msgs]
+        if mode == "sequential":
+            baseline = ids
+        rows.append({"mode": mode, "ms_p50": round(_pct(times, 50), 1), "ms_p95": round(_pct(times, 95), 1),
+                     "round_trips": round(float(np.mean(trips)), 1), "messages": len(msgs),
+                     "same_as_seq": None if baseline is None else ids == baseline})
+    server.shutdown()
+
+    report = {"limit": args.limit, "rtt_ms": args.rtt_ms, "fail_every": args.fail_every,
+              "repeat": args.repeat, "batch_size": fr.GMAIL_BATCH_SIZE,
+              "concurrency": fr.GMAIL_CONCURRENCY, "modes": rows}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"\n{args.limit} messages, {args.rtt_ms:.0f} ms per round trip, "
+          f"{'every %dth fails' % args.fail_every if args.fail_every else 'no failures'}, "
+          f"{args.repeat} runs per mode (batch size {fr.GMAIL_BATCH_SIZE}, {fr.GMAIL_CONCURRENCY} threads)")
+    print(f"{'mode':<12}{'ms_p50':>9}{'ms_p95':>9}{'trips':>7}{'msgs':>6}  same_as_seq")
+    for r in rows:
+        same = "-" if r["same_as_seq"] is None else ("yes" if r["same_as_seq"] else "NO")
+        print(f"{r['mode']:<12}{r['ms_p50']:>9.1f}{r['ms_p95']:>9.1f}{r['round_trips']:>7.1f}{r['messages']:>6}  {same}")
+    return 0 if all(r["same_as_seq"] is not False for r in rows) else 1
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--limit", type=int, default=25, help="messages per fetch (the summarize path caps list at 30)")
+    ap.add_argument("--rtt-ms", type=float, default=80.0, help="latency the fake server adds per HTTP request")
+    ap.add_argument("--fail-every", type=int, default=0, help="answer 404 for every Nth message id (0 = never)")
+    ap.add_argument("--repeat", type=int, default=5, help="timed fetches per mode")
+    ap.add_argument("--modes", nargs="+", default=["sequential", "threads", "batch"],
+                    choices=["sequential", "threads", "batch"])
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
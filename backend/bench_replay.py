@@ -0,0 +1,237 @@
+"""
+Replay recorded audio through the voice daemon without a microphone.
+
+  python bench_replay.py corpus/                 # as fast as the pipeline keeps up
+  python bench_replay.py a.wav b.wav --realtime  # paced like a live mic
+  python bench_replay.py corpus/ --json > run.json
+
+Each WAV (16-bit PCM, any rate; resampled to 16 kHz) is fed block by block into
+the same ring / Segmenter / STT / backend path listen_loop uses, followed by a
+short silence so its last phrase ends. /api/open is served by a local stub, so
+no Flask server or LLM is needed, and replies are not spoken.
+
+Reported:
+  phrases       phrases dispatched to STT, with file and position
+  seg_eos_ms    end of speech -> phrase dispatched, in audio time (hangover cost)
+  eos_wall_ms   the same in wall time (only meaningful with --realtime)
+  stt_rtf       STT seconds / phrase audio seconds (finalize only with STT_STREAMING=1)
+  trim_saved_s  silence cut before STT (STT_TRIM_PAD_MS), total and per phrase
+  cpu_s         process CPU for the whole replay, also per hour of audio
+  wake          with WAKE_WORD set: phrases passed/rejected by the gate and its
+                own CPU per hour of audio (follow-up windows are off unless --realtime)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+os.environ.setdefault("AINEK_TTS", "0")
+import voice_daemon as vd
+
+
+class StubBackend(BaseHTTPRequestHandler):
+    """Minimal /api/open and /api/open/stream that echo a fixed reply."""
+    reply = "Okay."
+    delay_s = 0.0
+    prompts = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            prompt = json.loads(body or b"{}").get("prompt", "")
+        except ValueError:
+            prompt = ""
+        StubBackend.prompts.append(prompt)
+        time.sleep(self.delay_s)
+        final = {"ok": True, "message": self.reply}  # what /api/open returns for a chat reply
+        if self.path == "/api/open":
+            data = json.dumps(final).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif self.path == "/api/open/stream":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            events = [("delta", {"text": self.reply}), ("done", {**final, "status": 200})]
+            for name, payload in events:
+                self.wfile.write(f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+
+def start_stub_backend(reply, delay_ms):
+    StubBackend.reply = reply
+    StubBackend.delay_s = delay_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBackend)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _collect_wavs(paths):
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            out.extend(os.path.join(p, n) for n in sorted(os.listdir(p)) if n.lower().endswith(".wav"))
+        elif p.lower().endswith(".wav"):
+            out.append(p)
+    return out
+
+
+def _read_phrases(path):
+    out = []
+    if not os.path.exists(path):
+        return out  # no phrase was recorded
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            if rec.get("type") == "phrase":
+                out.append(rec)
+    return out
+
+
+def _pct(xs, q):
+    return float(np.percentile(xs, q)) if len(xs) else float("nan")
+
+
+def replay(args):
+    wavs = _collect_wavs(args.paths)
+    if not wavs:
+        print("No WAV files found.")
+        return 1
+
+    server = start_stub_backend(args.reply, args.backend_ms)
+    vd.API_BASE = f"http://127.0.0.1:{server.server_address[1]}"
+    metrics_path = os.path.join(tempfile.mkdtemp(prefix="ainek-replay-"), "metrics.jsonl")
+    vd.METRICS.path = metrics_path
+
+    stt = vd.get_stt()
+    t0 = time.perf_counter()
+    stt.load()
+    stt.transcribe(np.zeros(vd.SAMPLE_RATE, dtype=np.float32))
+    load_s = time.perf_counter() - t0
+    vd.STT_READY.set()
+
+    if not args.realtime:
+        vd.WAKE_FOLLOWUP_SECONDS = 0  # wall-clock windows mean nothing faster than real time
+    if vd.WAKE_GATE.words:
+        vd.WAKE_GATE.load()
+
+    workers = vd.start_pipeline()
+    source = vd.ReplaySource(wavs, realtime=args.realtime)
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    try:
+        vd.listen_loop(source)
+        vd.phrase_q.join()
+        vd.text_q.join()
+    finally:
+        cpu_s, wall_s = time.process_time() - cpu0, time.perf_counter() - wall0
+        vd.stop_pipeline(workers)
+        server.shutdown()
+
+    phrases = sorted(_read_phrases(metrics_path), key=lambda rec: (rec.get("audio") or [0])[0])
+    rows, seg_eos, eos_wall, stt_ms, phrase_s = [], [], [], [], 0.0
+    for rec in phrases:
+        start, end, last_voiced = rec.get("audio") or (0, 0, 0)
+        path, at = source.locate(start)
+        dur = (end - start) / vd.SAMPLE_RATE
+        phrase_s += dur
+        seg_eos.append((end - last_voiced) / vd.SAMPLE_RATE * 1000.0)
+        spans = rec["spans"]
+        if "eos" in spans:
+            eos_wall.append(spans["eos"])
+        if "stt" in spans:
+            stt_ms.append(spans["stt"])
+        rows.append({"file": os.path.basename(path or "?"), "at_s": round(at, 2),
+                     "dur_s": round(dur, 2), "stt_ms": spans.get("stt"),
+                     "gated": "wake" in spans and "stt" not in spans})
+
+    hours = source.audio_s / 3600.0
+    report = {
+        "files": len(wavs),
+        "audio_s": round(source.audio_s, 1),
+        "mode": "realtime" if args.realtime else "max",
+        "vad": vd.VAD_ENGINE,
+        "stt": f"{stt.name}:{stt.model_name}",
+        "streaming": vd.STT_STREAMING,
+        "stt_load_s": round(load_s, 2),
+        "phrases": len(phrases),
+        "phrases_dropped": vd.PIPELINE_STATS["phrases_dropped"],
+        "ring_dropped_samples": vd.AUDIO_RING.dropped,
+        "backend_requests": len(StubBackend.prompts),
+        "seg_eos_ms_p50": round(_pct(seg_eos, 50), 1),
+        "seg_eos_ms_p95": round(_pct(seg_eos, 95), 1),
+        "eos_wall_ms_p50": round(_pct(eos_wall, 50), 1),
+        "eos_wall_ms_p95": round(_pct(eos_wall, 95), 1),
+        "stt_ms_p50": round(_pct(stt_ms, 50), 1),
+        "stt_ms_p95": round(_pct(stt_ms, 95), 1),
+        "stt_rtf": round(sum(stt_ms) / 1000.0 / phrase_s, 3) if phrase_s else None,
+        "trim_saved_s": round(vd.PIPELINE_STATS["trim_saved_s"], 2),
+        "trim_saved_s_per_phrase": round(vd.PIPELINE_STATS["trim_saved_s"] / len(phrases), 2) if phrases else None,
+        "wall_s": round(wall_s, 2),
+        "speed_x": round(source.audio_s / wall_s, 1) if wall_s else None,
+        "cpu_s": round(cpu_s, 2),
+        "cpu_s_per_audio_h": round(cpu_s / hours, 1) if hours else None,
+        "wake": ({**vd.WAKE_GATE.stats,
+                  "cpu_s_per_audio_h": round(vd.WAKE_GATE.stats["cpu_s"] / hours, 2) if hours else None}
+                 if vd.WAKE_GATE.enabled else None),
+        "phrase_list": rows,
+        "transcripts": list(StubBackend.prompts),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"\n{report['files']} files, {report['audio_s'] / 60:.1f} min audio, mode={report['mode']}, "
+          f"vad={report['vad']}, stt={report['stt']}{' (streaming)' if report['streaming'] else ''}")
+    print(f"{'file':<28}{'at_s':>8}{'dur_s':>7}{'stt_ms':>9}")
+    for r in rows:
+        stt_col = f"{r['stt_ms']:.0f}" if r["stt_ms"] is not None else ("gated" if r["gated"] else "-")
+        print(f"{r['file'][:27]:<28}{r['at_s']:>8.2f}{r['dur_s']:>7.2f}{stt_col:>9}")
+    print(f"phrases:      {report['phrases']} ({report['phrases_dropped']} dropped, "
+          f"{report['backend_requests']} sent to backend)")
+    print(f"segmentation: end of speech -> dispatch p50={report['seg_eos_ms_p50']:.0f}ms "
+          f"p95={report['seg_eos_ms_p95']:.0f}ms (audio time)"
+          + (f", wall p50={report['eos_wall_ms_p50']:.0f}ms" if args.realtime else ""))
+    if report["stt_rtf"] is not None:
+        print(f"stt:          RTF={report['stt_rtf']:.3f} p50={report['stt_ms_p50']:.0f}ms "
+              f"p95={report['stt_ms_p95']:.0f}ms (load {report['stt_load_s']:.1f}s, not counted)")
+    if report["trim_saved_s"]:
+        print(f"trim:         {report['trim_saved_s']:.1f}s of silence cut before STT "
+              f"({report['trim_saved_s_per_phrase']:.2f}s per phrase)")
+    if report["wake"]:
+        w = report["wake"]
+        print(f"wake gate:    {w['passed']} passed, {w['rejected']} rejected, {w['followups']} follow-ups; "
+              f"{w['cpu_s']:.2f} cpu-s ({w['cpu_s_per_audio_h']} per audio hour)")
+    print(f"cpu:          {report['cpu_s']:.1f}s over {report['wall_s']:.1f}s wall "
+          f"({report['speed_x']}x real time), {report['cpu_s_per_audio_h']} cpu-s per audio hour")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("paths", nargs="+", help="WAV files or directories")
+    ap.add_argument("--realtime", action="store_true", help="pace input like a live microphone")
+    ap.add_argument("--reply", default="Okay.", help="what the stub backend answers")
+    ap.add_argument("--backend-ms", type=float, default=0.0, help="stub backend latency")
+    ap.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = ap.parse_args(argv)
+    return replay(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+STT benchmarks for the voice daemon.
+
+  python bench_stt.py inmem path/to/phrases/        # temp-WAV vs in-memory path
+  python bench_stt.py engines path/to/corpus/       # RTF / memory / WER per engine
+
+Each WAV is treated as one phrase (16-bit PCM, any rate; resampled to 16 kHz).
+For WER, foo.wav needs its reference transcript in foo.ref.txt.
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import wave
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import numpy as np
+
+import voice_daemon as vd
+
+
+def _collect_wavs(paths):
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for name in sorted(os.listdir(p)):
+                if name.lower().endswith(".wav"):
+                    out.append(os.path.join(p, name))
+        elif p.lower().endswith(".wav"):
+            out.append(p)
+    return out
+
+
+def _load_phrase(path) -> np.ndarray:
+    with open(path, "rb") as f:
+        return vd._wav_bytes_to_float32(f.read())
+
+
+def _legacy_overhead(audio: np.ndarray):
+    """The pre-change path up to the model: int16 WAV pack -> temp file -> ffmpeg decode."""
+    import whisper
+
+    wav_bytes = io.BytesIO()
+    with wave.open(wav_bytes, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(vd.SAMPLE_RATE)
+        wf.writeframes((audio * 32767).astype(np.int16).tobytes())
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        tmp.write(wav_bytes.getvalue())
+        tmp_path = tmp.name
+    try:
+        return tmp_path, whisper.load_audio(tmp_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _legacy_transcribe(stt, audio: np.ndarray) -> str:
+    tmp_path, _ = _legacy_overhead(audio)
+    try:
+        result = stt.model.transcribe(
+            tmp_path,
+            fp16=False if stt.device == "cpu" else True,
+            language=None,
+            condition_on_previous_text=False,
+            initial_prompt=None,
+            temperature=0.0,
+        )
+        return (result.get("text") or "").strip()
+    finally:
+        os.unlink(tmp_path)
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def bench_inmem(args):
+    wavs = _collect_wavs(args.paths)
+    if not wavs:
+        print("No WAV files found.")
+        return 1
+    stt = vd.WhisperEngine()
+    stt.load()
+    # one throwaway run so neither path pays for lazy kernels
+    stt.transcribe(np.zeros(vd.SAMPLE_RATE, dtype=np.float32))
+
+    rows = []
+    for path in wavs:
+        audio = _load_phrase(path)
+        over_legacy, over_inmem, full_legacy, full_inmem = [], [], [], []
+        for _ in range(args.repeat):
+            def legacy_prep():
+                tmp_path, _ = _legacy_overhead(audio)
+                os.unlink(tmp_path)
+            over_legacy.append(_timed(legacy_prep))
+            over_inmem.append(_timed(vd._as_model_input, audio))
+            if not args.overhead_only:
+                full_legacy.append(_timed(_legacy_transcribe, stt, audio))
+                full_inmem.append(_timed(stt.transcribe, audio))
+        rows.append((os.path.basename(path), len(audio) / vd.SAMPLE_RATE,
+                     over_legacy, over_inmem, full_legacy, full_inmem))
+
+    med = statistics.median
+    print(f"model={stt.model_name} device={stt.device} repeat={args.repeat}")
+    print(f"{'phrase':<28}{'sec':>6}{'prep_old_ms':>13}{'prep_new_ms':>13}"
+          f"{'e2e_old_ms':>12}{'e2e_new_ms':>12}{'saved_ms':>10}")
+    saved_all = []
+    for name, dur, ol, oi, fl, fi in rows:
+        e2e_old = med(fl) if fl else float("nan")
+        e2e_new = med(fi) if fi else float("nan")
+        saved = (e2e_old - e2e_new) if fl else (med(ol) - med(oi))
+        saved_all.append(saved)
+        print(f"{name[:27]:<28}{dur:>6.1f}{med(ol):>13.1f}{med(oi):>13.3f}"
+              f"{e2e_old:>12.1f}{e2e_new:>12.1f}{saved:>10.1f}")
+    print(f"median saving per phrase: {med(saved_all):.1f} ms")
+    return 0
+
+
+def _words(text):
+    return re.sub(r"[^\w\s']", " ", (text or "").lower()).split()
+
+
+def word_errors(ref: str, hyp: str):
+    """(edit distance in words, reference length)."""
+    r, h = _words(ref), _words(hyp)
+    prev = list(range(len(h) + 1))
+    for i, rw in enumerate(r, 1):
+        cur = [i] + [0] * len(h)
+        for j, hw in enumerate(h, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (rw != hw))
+        prev = cur
+    return prev[-1], len(r)
+
+
+def _peak_rss_mb():
+    try:
+        import psutil
+
+        mi = psutil.Process().memory_info()
+        return getattr(mi, "peak_wset", mi.rss) / 2**20
+    except ImportError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def bench_engine_run(args):
+    """Child process for one engine, so load time and peak memory are its own."""
+    wavs = _collect_wavs(args.paths)
+    rss0 = _peak_rss_mb()
+    stt = vd.make_stt(args.engine)
+    t0 = time.perf_counter()
+    stt.load()
+    stt.transcribe(np.zeros(vd.SAMPLE_RATE, dtype=np.float32))
+    load_s = time.perf_counter() - t0
+
+    audio_s = decode_s = 0.0
+    errors = ref_words = 0
+    for path in wavs:
+        audio = _load_phrase(path)
+        t0 = time.perf_counter()
+        hyp = stt.transcribe(audio)
+        decode_s += time.perf_counter() - t0
+        audio_s += len(audio) / vd.SAMPLE_RATE
+        ref_path = os.path.splitext(path)[0] + ".ref.txt"
+        if os.path.exists(ref_path):
+            with open(ref_path, "r", encoding="utf-8") as f:
+                e, n = word_errors(f.read(), hyp)
+            errors += e
+            ref_words += n
+    print(json.dumps({
+        "engine": stt.name,
+        "model": stt.model_name,
+        "device": stt.device,
+        "files": len(wavs),
+        "audio_s": audio_s,
+        "load_s": load_s,
+        "rtf": decode_s / audio_s if audio_s else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "model_rss_mb": _peak_rss_mb() - rss0,
+        "wer": errors / ref_words if ref_words else None,
+    }))
+    return 0
+
+
+def bench_engines(args):
+    if not _collect_wavs(args.paths):
+        print("No WAV files found.")
+        return 1
+    print(f"{'engine':<16}{'model':<24}{'load_s':>8}{'RTF':>8}{'peak_MB':>9}{'WER':>8}")
+    for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+        cmd = [sys.executable, os.path.abspath(__file__), "engine-run", "--engine", engine, *args.paths]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("{")]
+        if proc.returncode != 0 or not lines:
+            err = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+            print(f"{engine:<16}error: {err}")
+            continue
+        r = json.loads(lines[-1])
+        wer = f"{r['wer'] * 100:.1f}%" if r["wer"] is not None else "n/a"
+        print(f"{r['engine']:<16}{r['model'][:23]:<24}{r['load_s']:>8.1f}{r['rtf']:>8.3f}"
+              f"{r['peak_rss_mb']:>9.0f}{wer:>8}")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("inmem", help="temp-WAV + ffmpeg path vs in-memory float32 path")
+    p.add_argument("paths", nargs="+", help="WAV files or directories")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--overhead-only", action="store_true",
+                   help="only time the pre-model conversion, skip inference")
+    p.set_defaults(func=bench_inmem)
+
+    p = sub.add_parser("engines", help="real-time factor, memory and WER per STT engine")
+    p.add_argument("paths", nargs="+", help="WAV files or directories (foo.ref.txt = reference)")
+    p.add_argument("--engines", default=",".join(vd.STT_ENGINES))
+    p.set_defaults(func=bench_engines)
+
+    p = sub.add_parser("engine-run", help=argparse.SUPPRESS)
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--engine", required=True)
+    p.set_defaults(func=bench_engine_run)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
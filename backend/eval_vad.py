@@ -0,0 +1,139 @@
+"""
+Evaluate VAD engines on labelled recordings.
+
+  python eval_vad.py corpus/ [--engines rms,adaptive,webrtc]
+
+Every foo.wav needs a foo.txt label file in Audacity format: one speech region
+per line, "start<TAB>end[<TAB>label]" in seconds. Recordings are pushed block by
+block through the same Segmenter the daemon uses.
+
+Reported per engine:
+  false/h     phrases that overlap no labelled speech, per hour of audio
+  junk_s      seconds of audio in those false phrases (what Whisper would chew on)
+  missed      labelled regions no phrase overlaps
+  onset_ms    phrase start - labelled start (median)
+  eos_ms      phrase dispatch - labelled end, i.e. segmentation latency (median / p95)
+  capped      phrases cut by MAX_RECORD_SECONDS
+"""
+import os
+import sys
+import argparse
+
+import numpy as np
+
+import voice_daemon as vd
+
+
+def _read_labels(path):
+    regions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split("\t")
+            if len(parts) >= 2:
+                try:
+                    regions.append((float(parts[0]), float(parts[1])))
+                except ValueError:
+                    continue
+    return sorted(regions)
+
+
+def _load_corpus(root):
+    items = []
+    names = sorted(os.listdir(root)) if os.path.isdir(root) else [os.path.basename(root)]
+    base = root if os.path.isdir(root) else os.path.dirname(root)
+    for name in names:
+        if not name.lower().endswith(".wav"):
+            continue
+        wav = os.path.join(base, name)
+        lab = os.path.splitext(wav)[0] + ".txt"
+        if not os.path.exists(lab):
+            print(f"skip {name}: no label file")
+            continue
+        with open(wav, "rb") as f:
+            audio = vd._wav_bytes_to_float32(f.read())
+        items.append((name, audio, _read_labels(lab)))
+    return items
+
+
+def segment(audio, engine):
+    """Returns [(start_s, end_s, capped)] as the daemon would dispatch them."""
+    seg = vd.Segmenter(vd.VAD_ENGINES[engine]())
+    out, start = [], None
+    for i in range(0, len(audio) - vd.BLOCK_SIZE + 1, vd.BLOCK_SIZE):
+        event = seg.push(audio[i:i + vd.BLOCK_SIZE])
+        t = (i + vd.BLOCK_SIZE) / vd.SAMPLE_RATE
+        if event == "start":
+            start = t
+        elif event == "end":
+            out.append((start, t, seg.samples >= seg.max_samples))
+            start = None
+    if start is not None:
+        out.append((start, len(audio) / vd.SAMPLE_RATE, False))
+    return out
+
+
+def _overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def evaluate(items, engine):
+    total_s, false, junk, missed, capped = 0.0, 0, 0.0, 0, 0
+    onset, eos = [], []
+    for _, audio, labels in items:
+        total_s += len(audio) / vd.SAMPLE_RATE
+        phrases = segment(audio, engine)
+        capped += sum(1 for p in phrases if p[2])
+        for p in phrases:
+            if not any(_overlaps(p, r) for r in labels):
+                false += 1
+                junk += p[1] - p[0]
+        for r in labels:
+            hits = [p for p in phrases if _overlaps(p, r)]
+            if not hits:
+                missed += 1
+                continue
+            onset.append(hits[0][0] - r[0])
+            # the phrase that contains the end of this region is the one whose dispatch matters
+            eos.append(hits[-1][1] - r[1])
+    pct = lambda xs, q: float(np.percentile(xs, q)) * 1000.0 if xs else float("nan")
+    return {
+        "engine": engine,
+        "false_per_h": false / (total_s / 3600.0) if total_s else 0.0,
+        "junk_s": junk,
+        "missed": missed,
+        "regions": sum(len(x[2]) for x in items),
+        "onset_ms": pct(onset, 50),
+        "eos_ms": pct(eos, 50),
+        "eos_p95_ms": pct(eos, 95),
+        "capped": capped,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("corpus", help="directory of WAV + label files (or a single WAV)")
+    ap.add_argument("--engines", default=",".join(vd.VAD_ENGINES))
+    args = ap.parse_args(argv)
+
+    items = _load_corpus(args.corpus)
+    if not items:
+        print("No labelled recordings found.")
+        return 1
+    hours = sum(len(a) for _, a, _ in items) / vd.SAMPLE_RATE / 3600.0
+    print(f"{len(items)} recordings, {hours * 60:.1f} min, "
+          f"onset={vd.VAD_ONSET_MS}ms hangover={vd.VAD_HANGOVER_MS}ms margin={vd.VAD_MARGIN_DB}dB")
+    print(f"{'engine':<10}{'false/h':>9}{'junk_s':>9}{'missed':>10}{'onset_ms':>10}"
+          f"{'eos_ms':>9}{'eos_p95':>9}{'capped':>8}")
+    for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+        if engine not in vd.VAD_ENGINES:
+            print(f"{engine:<10}(not available)")
+            continue
+        r = evaluate(items, engine)
+        print(f"{r['engine']:<10}{r['false_per_h']:>9.1f}{r['junk_s']:>9.1f}"
+              f"{r['missed']:>5}/{r['regions']:<4}{r['onset_ms']:>10.0f}"
+              f"{r['eos_ms']:>9.0f}{r['eos_p95_ms']:>9.0f}{r['capped']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
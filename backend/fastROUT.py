@@ -1,4 +1,5 @@
 import os
+import ast
 import time
 import threading
 import webbrowser
@@ -7,13 +8,19 @@ import json
 import calendar
 import unicodedata
 import base64
+import copy
+import hashlib
+import sqlite3
+import tempfile
 import requests
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
 import re
 import html as htmllib
-from collections import Counter
+from collections import Counter, OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify, render_template_string, stream_with_context
 import pyautogui
 import urllib.parse
 from email.mime.text import MIMEText
@@ -28,7 +35,11 @@ from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest, HttpRequest
+import google_auth_httplib2
+import httplib2
 
+import openai
 from openai import OpenAI
 
 logging.getLogger("googleapiclient.discovery_cache").setLevel(logging.ERROR)
@@ -40,7 +51,8 @@ logging.basicConfig(level=logging.INFO)
 
 try:
     from flask_cors import CORS
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    CORS(app, resources={r"/api/*": {"origins": "*"}},
+         expose_headers=["X-History-Cursor", "X-History-More", "X-History-Reset"])
 except Exception:
     app.logger.info("flask_cors not installed — continuing without it.")
 
@@ -56,11 +68,12 @@ except Exception as e:
     app.logger.warning(f"Tesseract not available: {e}")
 BROWSER_PATH = os.getenv("BROWSER_PATH")
 EXPLORER_NEW_WINDOW = os.getenv("EXPLORER_NEW_WINDOW", "1") == "1"
-CHAT_HISTORY = []
-CHAT_LOCK = threading.Lock()
-
 CURRENT_DRAFT = {}
 
+# counters for /api/stats
+_STATS = Counter()
+_STATS_LOCK = threading.Lock()
+
 _MONTHS = {
     "january":1,"february":2,"march":3,"april":4,"may":5,"june":6,
     "july":7,"august":8,"september":9,"october":10,"november":11,"december":12
@@ -112,8 +125,6 @@ SMARTS = {
     ord('’'): "'", ord('‘'): "'", ord('‚'): "'", ord('ʼ'): "'",
     ord('\u00A0'): ' ',  # nbsp
 }
-CODEFENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", flags=re.I | re.M)
-FIRST_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
 
 API_KEY = os.environ.get("FLASK_API_KEY", None)
 DRY_RUN = os.environ.get("DRY_RUN", "0") == "1"
@@ -126,6 +137,29 @@ REELS_SCROLL_INTERVAL = int(os.environ.get("REELS_SCROLL_INTERVAL", "8"))
 REELS_SCROLL_STEPS = int(os.environ.get("REELS_SCROLL_STEPS", "45"))
 REELS_CANCEL = threading.Event()
 
+# local fast path for common commands; below this confidence the LLM decides
+LOCAL_INTENT = os.environ.get("LOCAL_INTENT", "1") == "1"
+LOCAL_INTENT_MIN_CONF = float(os.environ.get("LOCAL_INTENT_MIN_CONF", "0.85"))
+
+# structured output: auto (probe once per model) | json_object | tools | text
+LLM_JSON_MODE = os.environ.get("LLM_JSON_MODE", "auto").strip().lower()
+
+# cache of LLM intent results for repeated prompts
+INTENT_CACHE = os.environ.get("INTENT_CACHE", "1") == "1"
+INTENT_CACHE_SIZE = int(os.environ.get("INTENT_CACHE_SIZE", "256"))
+# intent -> TTL seconds; intents not listed (send/compose/discard email, chat) are never cached
+INTENT_CACHE_TTL = {
+    "open_app": 3600,
+    "scroll_reels": 3600,
+    "stop_reels": 3600,
+    "desktop_task": 900,
+    "web_search": 600,
+    "summarize_emails": 300,
+}
+
+# start an intent's slow work (Gmail fetch, search, desktop steps) while the LLM is still writing the reply
+EARLY_DISPATCH = os.environ.get("EARLY_DISPATCH", "1") == "1"
+
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 GOOGLE_CSE_ID = os.environ.get("GOOGLE_CSE_ID")
 SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "5"))
@@ -140,11 +174,158 @@ if FASTR_API_KEY:
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 CRED_PATH = os.environ.get("GMAIL_CREDENTIALS_PATH") or os.path.join(APP_DIR, "credentials.json")
 TOKEN_PATH = os.environ.get("GMAIL_TOKEN_PATH") or os.path.join(APP_DIR, "token.json")
+# refresh the Gmail access token this long before it expires (in the background once a token is loaded)
+GMAIL_REFRESH_MARGIN_S = int(os.environ.get("GMAIL_REFRESH_MARGIN_S", "300"))
+# messages.get for a page of results: batch (one multipart request per GMAIL_BATCH_SIZE) | threads | sequential
+GMAIL_FETCH_MODE = os.environ.get("GMAIL_FETCH_MODE", "batch").strip().lower()
+GMAIL_BATCH_SIZE = max(1, min(int(os.environ.get("GMAIL_BATCH_SIZE", "50")), 100))
+GMAIL_CONCURRENCY = int(os.environ.get("GMAIL_CONCURRENCY", "10"))
+# e.g. a proxy; the batch endpoint is derived from it (blank = https://gmail.googleapis.com)
+GMAIL_API_ENDPOINT = os.environ.get("GMAIL_API_ENDPOINT", "").strip().rstrip("/")
+
+# chat history: last HISTORY_RING_SIZE turns in memory, all of them in SQLite (empty path = memory only)
+HISTORY_DB_PATH = os.environ.get("HISTORY_DB_PATH", "history.db").strip()
+if HISTORY_DB_PATH and HISTORY_DB_PATH != ":memory:":
+    HISTORY_DB_PATH = os.path.join(APP_DIR, os.path.expanduser(HISTORY_DB_PATH))
+HISTORY_RING_SIZE = int(os.environ.get("HISTORY_RING_SIZE", "500"))
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "200"))
+HISTORY_MAX_PAGE = 1000
+# turns handed to the intent prompt / cache key
+HISTORY_CONTEXT = 8
+
+# ---------------- chat history ----------------
+class HistoryStore:
+    """
+    Chat turns with a monotonically increasing "seq". The newest ring_size
+    turns stay in memory (context for the LLM, cheap polling); every turn is
+    appended to SQLite in WAL mode so history survives restarts. Pages are read
+    from the ring when the cursor is recent enough, else by primary key.
+    """
+    _BASE_KEYS = ("id", "sender", "text", "time")
+
+    def __init__(self, path: str, ring_size: int = 500):
+        self._lock = threading.Lock()
+        self._ring = deque(maxlen=max(1, ring_size))
+        self._seq = 0
+        self._db = None
+        if path:
+            try:
+                self._db = self._open(path)
+            except sqlite3.Error as e:
+                app.logger.warning(f"History DB unavailable ({e}); keeping history in memory only.")
+                self._db = None
+        if self._db is not None:
+            rows = self._db.execute("SELECT seq, id, sender, text, time, extra FROM history "
+                                    "ORDER BY seq DESC LIMIT ?", (self._ring.maxlen,)).fetchall()
+            for row in reversed(rows):
+                self._ring.append(self._from_row(row))
+            self._seq = rows[0][0] if rows else 0
+
+    @staticmethod
+    def _open(path: str):
+        db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS history ("
+                   "seq INTEGER PRIMARY KEY, id TEXT, sender TEXT, text TEXT, time REAL, extra TEXT)")
+        db.execute("CREATE INDEX IF NOT EXISTS history_id ON history(id)")
+        return db
+
+    @classmethod
+    def _from_row(cls, row) -> dict:
+        seq, id_, sender, text, ts, extra = row
+        entry = json.loads(extra) if extra else {}
+        entry.update({"id": id_, "sender": sender, "text": text, "time": ts, "seq": seq})
+        return entry
+
+    def append(self, entry: dict) -> dict:
+        entry = dict(entry)
+        entry.pop("seq", None)
+        extra = {k: v for k, v in entry.items() if k not in self._BASE_KEYS}
+        with self._lock:
+            seq = self._seq + 1
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT INTO history (seq, id, sender, text, time, extra) VALUES (?, ?, ?, ?, ?, ?)",
+                                     (seq, entry.get("id"), entry.get("sender"), entry.get("text"), entry.get("time"),
+                                      json.dumps(extra, ensure_ascii=False, default=str) if extra else None))
+                except sqlite3.Error:
+                    app.logger.exception("History DB write failed; entry kept in memory only")
+            self._seq = seq
+            entry["seq"] = seq
+            self._ring.append(entry)
+        return entry
+
+    def recent(self, n: int = HISTORY_CONTEXT) -> list:
+        """The last n turns, oldest first."""
+        with self._lock:
+            size = len(self._ring)
+            return list(islice(self._ring, max(0, size - n), size))
+
+    def resolve(self, cursor):
+        """
+        seq for a cursor given as a seq number or an entry id ("u-..."/"b-...").
+        None if the cursor is unknown (an id that was never stored or is gone
+        with a memory-only restart, a seq past the newest turn): the caller
+        should start over from the newest page rather than from seq 0.
+        """
+        cursor = str(cursor or "").strip()
+        if not cursor:
+            return None
+        if cursor.isdigit():
+            seq = int(cursor)
+            return seq if seq <= self._seq else None
+        with self._lock:
+            for e in reversed(self._ring):
+                if e.get("id") == cursor:
+                    return e["seq"]
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT MAX(seq) FROM history WHERE id = ?", (cursor,)).fetchone()
+            except sqlite3.Error:
+                app.logger.exception("History DB lookup failed")
+                return None
+        return row[0] if row and row[0] is not None else None
+
+    def page(self, since: int = None, limit: int = HISTORY_PAGE_SIZE) -> list:
+        """
+        Up to limit turns after seq `since`, oldest first; without a cursor the
+        newest `limit` turns. Cost is proportional to the page, not the history.
+        """
+        limit = max(1, min(int(limit), HISTORY_MAX_PAGE))
+        with self._lock:
+            first = self._ring[0]["seq"] if self._ring else self._seq + 1
+            if since is not None and since > self._seq:
+                since = None  # cursor from before a memory-only restart: start over from the newest page
+            if since is None:
+                start = self._seq - limit + 1
+                if start >= first or self._db is None:
+                    return list(islice(self._ring, max(0, len(self._ring) - limit), len(self._ring)))
+                rows = self._db.execute("SELECT seq, id, sender, text, time, extra FROM history "
+                                        "ORDER BY seq DESC LIMIT ?", (limit,)).fetchall()
+                return [self._from_row(r) for r in reversed(rows)]
+            if since + 1 >= first or self._db is None:
+                # seqs in the ring are contiguous, so the cursor maps straight to an offset
+                offset = max(0, since + 1 - first)
+                return list(islice(self._ring, offset, offset + limit))
+            rows = self._db.execute("SELECT seq, id, sender, text, time, extra FROM history "
+                                    "WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit)).fetchall()
+        return [self._from_row(r) for r in rows]
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+CHAT_HISTORY = HistoryStore(HISTORY_DB_PATH, HISTORY_RING_SIZE)
 
 # ---------------- core utils ----------------
 def _add_history_entry(entry: dict):
-    with CHAT_LOCK:
-        CHAT_HISTORY.append(entry)
+    CHAT_HISTORY.append(entry)
+
+def _stat_inc(name: str, n: int = 1):
+    with _STATS_LOCK:
+        _STATS[name] += n
 
 def _search_and_open(query: str):
     try:
@@ -196,6 +377,412 @@ def _open_app_by_name_from_llm(app_name_raw: str):
         return _open_mapped_target(key)
     return _search_and_open(app_name_raw)
 
+# ---------------- LLM structured output ----------------
+_JSON_MODES = ("json_object", "tools", "text")
+_LLM_CAPS = {}  # model -> structured-output mode that worked
+_LLM_CAPS_LOCK = threading.Lock()
+# the request itself was rejected (unsupported parameter) -> try the next mode
+_CAPABILITY_ERRORS = (openai.BadRequestError, openai.UnprocessableEntityError, openai.NotFoundError)
+_EMIT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "emit",
+        "description": "Return the answer as a JSON object with the keys described in the instructions.",
+        "parameters": {"type": "object", "additionalProperties": True},
+    },
+}
+
+class LLMParseError(ValueError):
+    """The model answered, but not with a JSON object."""
+    def __init__(self, msg, raw=""):
+        super().__init__(msg)
+        self.raw = raw
+
+def _llm_modes(model: str):
+    if LLM_JSON_MODE in _JSON_MODES:
+        return [LLM_JSON_MODE]
+    with _LLM_CAPS_LOCK:
+        known = _LLM_CAPS.get(model)
+    if known:
+        return [known]
+    return list(_JSON_MODES)
+
+def _llm_kwargs(mode: str, messages: list, temperature: float, max_tokens: int, model: str, stream: bool = False):
+    kwargs = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+    if stream:
+        kwargs["stream"] = True
+    if mode == "json_object":
+        kwargs["response_format"] = {"type": "json_object"}
+    elif mode == "tools":
+        kwargs["tools"] = [_EMIT_TOOL]
+        kwargs["tool_choice"] = {"type": "function", "function": {"name": "emit"}}
+    return kwargs
+
+def _llm_stream_text(event) -> str:
+    """JSON text in one streamed chunk: message content, or tool-call arguments in tools mode."""
+    if not event.choices:
+        return ""
+    delta = event.choices[0].delta
+    if getattr(delta, "tool_calls", None):
+        return "".join(call.function.arguments for call in delta.tool_calls if call.function and call.function.arguments)
+    return getattr(delta, "content", None) or ""
+
+def _llm_request(mode: str, messages: list, temperature: float, max_tokens: int, model: str):
+    resp = llm_client.chat.completions.create(**_llm_kwargs(mode, messages, temperature, max_tokens, model))
+    msg = resp.choices[0].message
+    if mode == "tools" and getattr(msg, "tool_calls", None):
+        return msg.tool_calls[0].function.arguments or ""
+    return msg.content or ""
+
+def _parse_llm_json(raw: str) -> dict:
+    try:
+        parsed = json.loads(raw)
+    except Exception:
+        try:
+            parsed = _coerce_json_from_text(raw)
+        except Exception as e:
+            raise LLMParseError(f"not JSON: {e}", raw)
+        _stat_inc("llm_json_repairs")
+    if not isinstance(parsed, dict):
+        raise LLMParseError("JSON is not an object", raw)
+    return parsed
+
+def _llm_json_completion(messages: list, temperature: float = 0.2, max_tokens: int = 500, model: str = None):
+    """
+    One chat completion that should come back as a JSON object.
+
+    The structured-output form each model accepts (JSON mode, a forced tool
+    call, or plain text) is learned on first use and remembered, so later
+    calls go straight to the right form instead of failing over every time.
+    Only a rejected request (400/404/422) moves on to the next form; transport
+    errors are raised as they are. Returns (parsed, raw); raises LLMParseError
+    if the answer isn't a JSON object.
+    """
+    model = model or LLM_MODEL
+    modes = _llm_modes(model)
+    for i, mode in enumerate(modes):
+        _stat_inc("llm_calls")
+        try:
+            raw = _llm_request(mode, messages, temperature, max_tokens, model)
+        except _CAPABILITY_ERRORS as e:
+            if i == len(modes) - 1:
+                raise
+            _stat_inc("llm_capability_fallbacks")
+            app.logger.info("LLM %s rejected %s output (%s); trying %s", model, mode, e.__class__.__name__, modes[i + 1])
+            continue
+        except Exception:
+            _stat_inc("llm_transport_failures")
+            raise
+        if len(modes) > 1:
+            with _LLM_CAPS_LOCK:
+                _LLM_CAPS[model] = mode
+            app.logger.info("LLM %s: using %s output", model, mode)
+        return _parse_llm_json_counted(raw), raw
+
+def _parse_llm_json_counted(raw: str) -> dict:
+    try:
+        return _parse_llm_json(raw)
+    except LLMParseError:
+        _stat_inc("llm_parse_failures")
+        raise
+
+def _clean_llm_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    text = text.replace("\ufeff", "").replace("\u200b", "")
+    return text.translate(SMARTS)
+
+def _loads_tolerant(text: str):
+    """
+    json.loads, then without trailing commas, then both again with smart quotes
+    straightened, then as a Python literal; else the text itself.
+    """
+    for candidate in (text, _clean_llm_text(text)):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+        try:
+            return json.loads(re.sub(r",\s*([}\]])", r"\1", candidate))
+        except ValueError:
+            pass
+    try:
+        return ast.literal_eval(text)
+    except Exception:
+        return text
+
+class _IncrementalJSON:
+    """
+    Tolerant parser for one JSON object that arrives in pieces. Anything
+    before the first "{" (a code fence, "Sure, here it is:") and after the
+    closing "}" is ignored; smart quotes, single quotes, bare keys, Python
+    literals and trailing commas are accepted. Only the structure is
+    normalised: string contents are kept exactly as written, so a curly quote
+    inside a straight-quoted value stays a curly quote.
+
+    feed() returns what just became known about the top-level keys:
+      ("text", key, piece)   more of a string value that is still arriving
+      ("field", key, value)  a value is complete (also in .fields)
+    """
+    _ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+    _LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+    _BARE_KEY_RE = re.compile(r"[A-Za-z_][\w\-]*")
+    _BARE_VALUE_RE = re.compile(r"[^\s,}\]]+")
+    _QUOTES = "\"'“”„‟‘’‚ʼ"
+    # a string opened with a straight quote ends only at the same quote; one opened with a smart quote at any of its kind
+    _CLOSERS = {'"': '"', "'": "'", **dict.fromkeys("“”„‟", "“”„‟\""), **dict.fromkeys("‘’‚ʼ", "‘’‚ʼ'")}
+    _IGNORABLE = "\ufeff\u200b"
+
+    def __init__(self):
+        self.buf = ""
+        self.fields = {}
+        self.opened = []  # keys whose value has started, in order
+        self.done = False
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self._quote = None
+        self._str = None
+        self._nest = None
+
+    def feed(self, chunk: str) -> list:
+        self.buf += chunk
+        events = []
+        while not self.done and self._step(events):
+            pass
+        return events
+
+    def value(self) -> dict:
+        """Fields so far, including the part of a string value that has arrived."""
+        out = dict(self.fields)
+        if self._state == "string":
+            out[self._key] = "".join(self._str)
+        return out
+
+    def _skip(self, chars=""):
+        s, i = self.buf, self._pos
+        while i < len(s) and (s[i].isspace() or s[i] in self._IGNORABLE or (chars and _clean_llm_text(s[i]) in chars)):
+            i += 1
+        self._pos = i
+        return i < len(s)
+
+    def _field(self, events, value):
+        self.fields[self._key] = value
+        events.append(("field", self._key, value))
+        self._state, self._key = "key", None
+
+    def _step(self, events) -> bool:
+        s, state = self.buf, self._state
+        if state == "start":
+            i = s.find("{", self._pos)
+            if i < 0:
+                self._pos = len(s)
+                return False
+            self._pos, self._state = i + 1, "key"
+            return True
+
+        if state == "key":
+            if not self._skip(","):
+                return False
+            c = s[self._pos]
+            if _clean_llm_text(c) == "}":
+                self._pos += 1
+                self.done = True
+                return False
+            if c in self._QUOTES:
+                key, end, closed = self._read_string(self._pos + 1, c)
+                if not closed:
+                    return False
+            else:
+                m = self._BARE_KEY_RE.match(s, self._pos)
+                if not m:
+                    self._pos += 1  # stray character between members
+                    return True
+                if m.end() == len(s):
+                    return False
+                key, end = m.group(0), m.end()
+            self._key, self._pos, self._state = key, end, "colon"
+            return True
+
+        if state == "colon":
+            if not self._skip():
+                return False
+            if _clean_llm_text(s[self._pos]) == ":":
+                self._pos += 1
+            self.opened.append(self._key)
+            self._state = "value"
+            return True
+
+        if state == "value":
+            if not self._skip():
+                return False
+            c = s[self._pos]
+            if c in self._QUOTES:
+                self._quote, self._str = c, []
+                self._pos += 1
+                self._state = "string"
+                return True
+            if c in "{[":
+                self._nest = (self._pos, self._pos, 0, None, False)
+                self._state = "nested"
+                return True
+            m = self._BARE_VALUE_RE.match(s, self._pos)
+            if not m:
+                self._field(events, None)  # "key": , or "key": }
+                return True
+            if m.end() == len(s):
+                return False  # a number or literal may still be growing
+            self._pos = m.end()
+            self._field(events, self._bare(m.group(0)))
+            return True
+
+        if state == "string":
+            text, end, closed = self._read_string(self._pos, self._quote)
+            self._pos = end
+            if text:
+                self._str.append(text)
+                events.append(("text", self._key, text))
+            if not closed:
+                return False
+            value, self._str = "".join(self._str), None
+            self._field(events, value)
+            return True
+
+        # nested object/array: wait for its closing bracket, then parse it whole
+        start, i, depth, quote, esc = self._nest
+        while i < len(s):
+            c = s[i]
+            i += 1
+            if quote:
+                if esc:
+                    esc = False
+                elif c == "\\":
+                    esc = True
+                elif c in self._CLOSERS[quote]:
+                    quote = None
+            elif c in self._QUOTES:
+                quote = c
+            elif c in "{[":
+                depth += 1
+            elif c in "}]":
+                depth -= 1
+                if depth == 0:
+                    self._pos, self._nest = i, None
+                    self._field(events, _loads_tolerant(s[start:i]))
+                    return True
+        self._nest = (start, i, depth, quote, esc)
+        return False
+
+    def _bare(self, token: str):
+        if token in self._LITERALS:
+            return self._LITERALS[token]
+        try:
+            return json.loads(token)
+        except ValueError:
+            return token
+
+    def _read_string(self, i: int, quote: str):
+        """Decode from i up to the closing quote: (text, end, closed). Stops before a split escape."""
+        s, out, closers = self.buf, [], self._CLOSERS[quote]
+        while i < len(s):
+            c = s[i]
+            if c in closers:
+                # a closing quote is only trusted before a delimiter, so 'it's' and “a ”quoted” word” survive;
+                # in valid JSON an unescaped quote is always followed by one anyway
+                j = i + 1
+                while j < len(s) and s[j].isspace():
+                    j += 1
+                if j == len(s):
+                    break
+                if _clean_llm_text(s[j]) in ",:}]":
+                    return "".join(out), i + 1, True
+                out.append(c)
+                i += 1
+                continue
+            if c != "\\":
+                out.append(c)
+                i += 1
+                continue
+            if i + 1 >= len(s):
+                break
+            e = s[i + 1]
+            if e != "u":
+                out.append(self._ESCAPES.get(e, e))
+                i += 2
+                continue
+            if i + 6 > len(s):
+                break
+            try:
+                code = int(s[i + 2:i + 6], 16)
+            except ValueError:
+                out.append("u")
+                i += 2
+                continue
+            if 0xD800 <= code < 0xDC00:
+                if i + 12 > len(s):
+                    break
+                try:
+                    low = int(s[i + 8:i + 12], 16) if s[i + 6:i + 8] == "\\u" else 0
+                except ValueError:
+                    low = 0
+                if 0xDC00 <= low < 0xE000:
+                    out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+                code = 0xFFFD
+            out.append(chr(code))
+            i += 6
+        return "".join(out), i, False
+
+def _stream_json_result(parser: "_IncrementalJSON") -> dict:
+    """
+    The object at the end of a stream: strict json.loads of the whole text when
+    it is valid JSON, so the tolerant rules never touch a well-formed answer.
+    """
+    if not parser.done:
+        return _parse_llm_json_counted(parser.buf)
+    try:
+        parsed = json.loads(parser.buf)
+        if isinstance(parsed, dict):
+            return parsed
+    except ValueError:
+        pass
+    _stat_inc("llm_json_repairs")
+    return parser.value()
+
+def _llm_json_stream(messages: list, temperature: float = 0.2, max_tokens: int = 500, model: str = None):
+    """
+    Streaming form of _llm_json_completion: yields the JSON text (message
+    content, or the tool-call arguments in tools mode) as it is generated,
+    using the same learned structured-output mode.
+    """
+    model = model or LLM_MODEL
+    modes = _llm_modes(model)
+    for i, mode in enumerate(modes):
+        _stat_inc("llm_calls")
+        try:
+            stream = llm_client.chat.completions.create(**_llm_kwargs(mode, messages, temperature, max_tokens, model, stream=True))
+        except _CAPABILITY_ERRORS as e:
+            if i == len(modes) - 1:
+                raise
+            _stat_inc("llm_capability_fallbacks")
+            app.logger.info("LLM %s rejected streamed %s output (%s); trying %s", model, mode, e.__class__.__name__, modes[i + 1])
+            continue
+        except Exception:
+            _stat_inc("llm_transport_failures")
+            raise
+        if len(modes) > 1:
+            with _LLM_CAPS_LOCK:
+                _LLM_CAPS[model] = mode
+        try:
+            for event in stream:
+                text = _llm_stream_text(event)
+                if text:
+                    yield text
+        except Exception:
+            _stat_inc("llm_transport_failures")
+            raise
+        return
+
 # ---------------- LLM intent ----------------
 def _build_messages_for_llm(prompt: str, history_entries: list):
     system_msg = {
@@ -241,14 +828,18 @@ def _build_messages_for_llm(prompt: str, history_entries: list):
 def _coerce_json_from_text(text: str):
     if text is None:
         raise ValueError("empty content")
-    text = unicodedata.normalize("NFKC", text)
-    text = text.replace("\ufeff", "").replace("\u200b", "")
-    text = CODEFENCE_RE.sub("", text.strip())
-    text = text.translate(SMARTS)
-    m = FIRST_JSON_OBJECT_RE.search(text)
-    if m:
-        text = m.group(0)
-    return json.loads(text)
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            return parsed
+    except ValueError:
+        pass
+    parser = _IncrementalJSON()
+    parser.feed(text)
+    parsed = parser.value()
+    if not parser.done and not parsed:
+        raise ValueError("no JSON object in text")
+    return parsed
 
 def _maybe_force_web_search(user_prompt: str, parsed: dict) -> dict:
     if not isinstance(parsed, dict):
@@ -267,43 +858,302 @@ def _maybe_force_web_search(user_prompt: str, parsed: dict) -> dict:
             parsed["k"] = parsed.get("k") or SEARCH_MAX_RESULTS
     return parsed
 
-def _ask_llm_for_intent(prompt: str, history_entries: list):
+# ---------------- local intent fast path ----------------
+_FILLER_RE = re.compile(r"^(?:(?:hey|ok|okay|hi)\s+)?(?:ainek[\s,]+)?(?:(?:please|can you|could you|would you|will you|kindly)\s+)*", re.I)
+_TRAILING_RE = re.compile(r"(?:\s+(?:please|for me|now|right now|thanks|thank you))+$", re.I)
+_STOP_REELS_RE = re.compile(r"^(?:stop|pause|end|quit|halt|cancel)\b.*\b(?:reels?|scroll(?:ing)?|instagram)$|^stop scrolling$")
+_SCROLL_REELS_RE = re.compile(r"^(?:scroll|play|watch|start|show me)\b.*\breels?$")
+_DISCARD_RE = re.compile(r"^(?:discard|cancel|delete|scrap|trash|drop|throw away|forget)\b(?:\s+(?:the|that|this|my))?\s+(?:draft|email|mail|message)$|^(?:discard|scrap)(?: it)?$")
+_SEND_RE = re.compile(r"^(?:yes\s+)?send(?: it| the (?:email|mail|draft|message))?(?: now)?$")
+_OPEN_APP_RE = re.compile(r"^(?:open|launch|start|run|bring up|go to|fire up)\s+(?:the\s+|my\s+)?(.+?)(?:\s+(?:app|application|website|site|program))?$")
+
+_LOCAL_REPLIES = {
+    "stop_reels": "Stopping reels.",
+    "scroll_reels": "Starting reels.",
+    "discard_email": "Draft discarded.",
+    "send_email": "Sending it now.",
+    "desktop_task": "On it.",
+}
+
+def _intent_dict(intent: str, reply: str, **fields) -> dict:
+    """Same shape as the LLM's intent JSON (see _build_messages_for_llm)."""
+    parsed = {k: None for k in ("app", "to", "subject", "body", "sender", "query", "limit", "search_query", "k", "instruction")}
+    parsed.update(fields)
+    parsed["intent"] = intent
+    parsed["reply"] = reply
+    return parsed
+
+def _local_intent(prompt: str):
+    """
+    Deterministic/fuzzy match for commands that don't need the LLM.
+    Returns (confidence, parsed) or (0.0, None).
+    """
+    text = _norm_text(prompt)
+    text = re.sub(r"[^\w\s:\\%~./-]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = _TRAILING_RE.sub("", _FILLER_RE.sub("", text)).strip(" .")
+    if not text:
+        return 0.0, None
+
+    # the LLM path forces these to desktop_task too (_maybe_force_web_search)
+    if _is_desktopish_request(prompt):
+        return 1.0, _intent_dict("desktop_task", _LOCAL_REPLIES["desktop_task"], instruction=prompt.strip())
+    if _STOP_REELS_RE.match(text):
+        return 1.0, _intent_dict("stop_reels", _LOCAL_REPLIES["stop_reels"])
+    if _SCROLL_REELS_RE.match(text):
+        return 0.95, _intent_dict("scroll_reels", _LOCAL_REPLIES["scroll_reels"])
+    if _DISCARD_RE.match(text):
+        return 0.95, _intent_dict("discard_email", _LOCAL_REPLIES["discard_email"])
+    if _SEND_RE.match(text):
+        # only with a staged draft; otherwise the LLM should work out what to send
+        return (0.95 if CURRENT_DRAFT else 0.0), _intent_dict("send_email", _LOCAL_REPLIES["send_email"])
+
+    m = _OPEN_APP_RE.match(text)
+    if m:
+        name = m.group(1).strip()
+        if name in APP_MAP:
+            return 1.0, _intent_dict("open_app", f"Opening {name}.", app=name)
+        close = difflib.get_close_matches(name, APP_MAP.keys(), n=1, cutoff=0.6)
+        if close:
+            score = difflib.SequenceMatcher(None, name, close[0]).ratio()
+            return score, _intent_dict("open_app", f"Opening {close[0]}.", app=close[0])
+    return 0.0, None
+
+# ---------------- intent cache ----------------
+_ANAPHORA_RE = re.compile(r"\b(it|that|this|those|these|them|him|her|again|same|previous|last one|reply|instead)\b")
+
+class _IntentCache:
+    """LRU of parsed intents with a per-entry TTL. Values are copied in and out."""
+
+    def __init__(self, maxsize: int = INTENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, parsed = item
+            if expires < time.monotonic():
+                del self._data[key]
+                _stat_inc("intent_cache_expired")
+                return None
+            self._data.move_to_end(key)
+            return copy.deepcopy(parsed)
+
+    def put(self, key, parsed: dict, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, copy.deepcopy(parsed))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                _stat_inc("intent_cache_evictions")
+
+    def __len__(self):
+        return len(self._data)
+
+_INTENT_CACHE = _IntentCache()
+
+def _intent_cache_key(prompt: str, history_entries: list) -> str:
+    """
+    Normalized prompt plus the context the answer can depend on: whether a
+    draft is staged, and for prompts that refer back ("send it", "open that
+    again") the previous turns as well.
+    """
+    text = re.sub(r"[^\w\s]", "", _norm_text(prompt))
+    text = re.sub(r"\s+", " ", text).strip()
+    ctx = [f"draft={bool(CURRENT_DRAFT)}"]
+    if _ANAPHORA_RE.search(text):
+        prior = list(history_entries or [])
+        if prior and prior[-1].get("sender") == "user" and prior[-1].get("text", "").strip() == prompt.strip():
+            prior = prior[:-1]  # routes add the prompt itself before asking
+        ctx.extend(f"{e.get('sender')}:{e.get('text', '')}" for e in prior[-2:])
+    digest = hashlib.sha1("\x1f".join(ctx).encode("utf-8")).hexdigest()[:16]
+    return f"{text}|{digest}"
+
+def _quick_intent(prompt: str, history_entries: list):
+    """Intent from the local matcher or the cache, or None if the LLM has to decide."""
+    if LOCAL_INTENT:
+        t0 = time.perf_counter()
+        conf, parsed = _local_intent(prompt)
+        _stat_inc("local_intent_us", int((time.perf_counter() - t0) * 1e6))
+        if parsed and conf >= LOCAL_INTENT_MIN_CONF:
+            _stat_inc("local_intent_hits")
+            app.logger.info("Local intent %s (conf %.2f): %r", parsed["intent"], conf, prompt)
+            return parsed
+        _stat_inc("local_intent_misses")
+    if INTENT_CACHE:
+        cached = _INTENT_CACHE.get(_intent_cache_key(prompt, history_entries))
+        if cached is not None:
+            _stat_inc("intent_cache_hits")
+            return cached
+        _stat_inc("intent_cache_misses")
+    return None
+
+def _remember_intent(prompt: str, history_entries: list, parsed: dict):
+    ttl = INTENT_CACHE_TTL.get(parsed.get("intent")) if isinstance(parsed, dict) else None
+    if INTENT_CACHE and ttl:
+        _INTENT_CACHE.put(_intent_cache_key(prompt, history_entries), parsed, ttl)
+
+def _ask_llm_for_intent(prompt: str, history_entries: list, prefetch: dict = None):
+    parsed = _quick_intent(prompt, history_entries)
+    if parsed is not None:
+        return True, parsed
+    ok, parsed = _llm_intent(prompt, history_entries, prefetch)
+    if ok:
+        _remember_intent(prompt, history_entries, parsed)
+    return ok, parsed
+
+def _finish_llm_intent(prompt: str, parsed: dict) -> dict:
+    parsed = _maybe_force_web_search(prompt, parsed)
+    if (parsed.get("intent") == "desktop_task") and not parsed.get("instruction"):
+        parsed["instruction"] = prompt.strip()
+    return parsed
+
+def _llm_intent(prompt: str, history_entries: list, prefetch: dict = None):
     if not llm_client:
         return False, "LLM disabled: FASTR_API_KEY not set (FastRouter only)."
-    messages = _build_messages_for_llm(prompt, history_entries)
+    parsed = None
     try:
-        parsed = None
-        try:
-            resp = llm_client.chat.completions.create(
-                model=LLM_MODEL, messages=messages,
-                temperature=0.7, max_tokens=300,
-                response_format={"type": "json_object"},
-            )
-            content = resp.choices[0].message.content
-            parsed = json.loads(content)
-        except Exception:
-            resp = llm_client.chat.completions.create(
-                model=LLM_MODEL, messages=messages,
-                temperature=0.7, max_tokens=300,
-            )
-            content = resp.choices[0].message.content
-            parsed = _coerce_json_from_text(content)
-        parsed = _maybe_force_web_search(prompt, parsed)
-        if (parsed.get("intent") == "desktop_task") and not parsed.get("instruction"):
-            parsed["instruction"] = prompt.strip()
-        return True, parsed
+        # streamed even without a listener, so the work for the intent can start early
+        for kind, value in _stream_llm_intent(prompt, history_entries, prefetch):
+            if kind == "intent":
+                parsed = value
+    except LLMParseError as e:
+        app.logger.warning("JSON parse failed; raw=%r", e.raw)
+        return False, f"LLM responded but JSON parse failed. Raw: {e.raw}"
     except Exception as e:
-        try:
-            content = locals().get("content", "")
-            start, end = (content or "").find("{"), (content or "").rfind("}")
-            if start != -1 and end > start:
-                parsed = json.loads(content[start:end+1])
-                parsed = _maybe_force_web_search(prompt, parsed)
-                return True, parsed
-        except Exception:
-            pass
-        app.logger.warning("JSON parse failed; raw=%r", locals().get("content", ""))
-        return False, f"LLM responded but JSON parse failed. Raw: {locals().get('content','')}"
+        app.logger.warning("LLM intent call failed: %s", e)
+        return False, f"LLM call failed: {e}"
+    return True, parsed
+
+def _stream_llm_intent(prompt: str, history_entries: list, prefetch: dict = None):
+    """
+    Streamed intent completion: yields ("delta", text) for chat reply text as
+    it is generated, then ("intent", parsed) once the JSON is complete. With
+    a prefetch dict, the slow part of the intent is started (_maybe_prefetch)
+    as soon as its arguments are in, while the reply is still being written.
+    """
+    messages = _build_messages_for_llm(prompt, history_entries)
+    # prompts that the router would turn into a search/desktop task never speak the chat reply
+    stream_reply = _maybe_force_web_search(prompt, {"intent": "chat"}).get("intent") == "chat"
+    parser = _IncrementalJSON()
+    for chunk in _llm_json_stream(messages, temperature=0.7, max_tokens=300):
+        for kind, key, value in parser.feed(chunk):
+            if kind == "text" and key == "reply" and stream_reply and parser.fields.get("intent") == "chat":
+                yield "delta", value
+        if prefetch is not None and EARLY_DISPATCH and not parser.done:
+            _maybe_prefetch(prompt, parser, prefetch)
+    yield "intent", _finish_llm_intent(prompt, _stream_json_result(parser))
+
+# ---------------- early dispatch ----------------
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+# intent -> keys its work depends on; it can start once these are complete
+_PREFETCH_KEYS = {
+    "summarize_emails": ("sender", "query", "limit"),
+    "web_search": ("search_query", "k"),
+    "desktop_task": ("instruction",),
+    "open_app": ("app",),
+}
+# these change something on screen, so they wait until only the reply is left to come
+_PREFETCH_SIDE_EFFECTS = {"desktop_task", "open_app"}
+
+def _summarize_query(prompt: str, resp: dict):
+    """(gmail query, limit) for a summarize_emails intent; the query is None without sender or query."""
+    q = (resp.get("query") or "").strip()
+    sender = (resp.get("sender") or "").strip()
+    limit = int(resp.get("limit") or 15)
+    if not q:
+        if not sender:
+            return None, limit
+        q = _sender_to_query(sender)
+    rng = _parse_date_range_from_text(prompt)
+    if rng:
+        q = f"{q} after:{rng['after']} before:{rng['before']}"
+    else:
+        if "newer_than:" not in q and "after:" not in q and "before:" not in q:
+            q = f"{q} newer_than:30d"
+    return q, limit
+
+def _search_args(prompt: str, resp: dict):
+    q = (resp.get("search_query") or prompt or "").strip()
+    return q, int(resp.get("k") or SEARCH_MAX_RESULTS)
+
+def _run_desktop_instruction(instruction: str):
+    """Plan and execute. Returns (ok_plan, plan_or_err, (exec_ok, logs, listed, err) or None)."""
+    ok_plan, plan_or_err = _plan_desktop_instruction(instruction)
+    if not ok_plan:
+        return False, plan_or_err, None
+    return True, plan_or_err, _execute_desktop_plan(plan_or_err)
+
+def _prefetch_job(prompt: str, resp: dict):
+    """(args, fn) that _dispatch_intent will call for this intent, or None."""
+    intent = resp.get("intent")
+    if intent == "summarize_emails":
+        q, limit = _summarize_query(prompt, resp)
+        return ((q, limit), _gmail_fetch_messages) if q else None
+    if intent == "web_search":
+        return _search_args(prompt, resp), _google_search
+    if intent == "desktop_task" and resp.get("instruction"):
+        return (resp["instruction"],), _run_desktop_instruction
+    if intent == "open_app" and resp.get("app"):
+        return (resp["app"],), _open_app_by_name_from_llm
+    return None
+
+def _prefetch_due(prompt: str, parser: _IncrementalJSON, prefetch: dict):
+    """The intent fields once the intent's work may start (at most once per intent), else None."""
+    intent = parser.fields.get("intent")
+    keys = _PREFETCH_KEYS.get(intent)
+    if not keys or intent in prefetch:
+        return None
+    # the schema puts "reply" last: once it starts, every other key is final
+    reply_started = "reply" in parser.opened
+    have_keys = all(k in parser.fields for k in keys)
+    if intent in _PREFETCH_SIDE_EFFECTS:
+        # nothing enforces the key order, so on-screen work also needs its own arguments, never a fallback
+        if not (reply_started and have_keys and all(parser.fields.get(k) for k in keys)):
+            return None
+    elif not (reply_started or have_keys):
+        return None
+    prefetch[intent] = None
+    resp = _finish_llm_intent(prompt, dict(parser.fields))
+    return resp if resp.get("intent") == intent else None
+
+def _start_prefetch(prefetch: dict, intent: str, job, submit):
+    """Run job = (args, fn) via submit(fn, *args) and record the future for _prefetched."""
+    if job is None:
+        return
+    args, fn = job
+    prefetch[intent] = (args, submit(fn, *args))
+    _stat_inc("prefetch_started")
+    app.logger.info("Started %s%r while the reply is still streaming", intent, args)
+
+def _maybe_prefetch(prompt: str, parser: _IncrementalJSON, prefetch: dict):
+    resp = _prefetch_due(prompt, parser, prefetch)
+    if resp is not None:
+        _start_prefetch(prefetch, resp["intent"], _prefetch_job(prompt, resp), _PREFETCH_POOL.submit)
+
+class PrefetchConflict(RuntimeError):
+    """An on-screen action already ran early with different arguments than the final intent."""
+
+def _prefetched(prefetch: dict, intent: str, args: tuple, fn):
+    """
+    fn(*args), or the result of the same call already started by _maybe_prefetch.
+    A side-effect job that has already started is never run a second time: with
+    other arguments the request fails with PrefetchConflict instead.
+    """
+    entry = (prefetch or {}).get(intent)
+    if entry:
+        if entry[0] == args:
+            _stat_inc("prefetch_used")
+            return entry[1].result()
+        _stat_inc("prefetch_discarded")
+        if intent in _PREFETCH_SIDE_EFFECTS and not entry[1].cancel():
+            entry[1].exception()  # let it finish before reporting
+            raise PrefetchConflict(f"Already started {intent} with {entry[0]!r}, not {args!r}; not running it twice.")
+    return fn(*args)
 
 def _require_api_key(req):
     if not API_KEY:
@@ -347,31 +1197,190 @@ def _open_instagram_reels_and_autoscroll(interval: int = REELS_SCROLL_INTERVAL,
         return False, f"Autoscroll error: {e}"
 
 # ---------------- Gmail ----------------
-def _gmail_service():
-    creds = None
-    if os.path.exists(TOKEN_PATH):
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, GMAIL_SCOPES)
+# One credentials object and one service per process. httplib2 connections are
+# not thread-safe, so every request runs on a per-thread AuthorizedHttp.
+_GMAIL_LOCK = threading.RLock()
+_GMAIL_CREDS = None
+_GMAIL_SVC = None
+_GMAIL_REFRESHER = None
+_GMAIL_HTTP = threading.local()
+
+def _gmail_creds_fresh(creds, margin_s: float = GMAIL_REFRESH_MARGIN_S) -> bool:
+    """Valid and not expiring within margin_s."""
     if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            if not os.path.exists(CRED_PATH):
-                raise RuntimeError(f"credentials.json not found at: {CRED_PATH}. Set GMAIL_CREDENTIALS_PATH or place the file there.")
-            flow = InstalledAppFlow.from_client_secrets_file(CRED_PATH, GMAIL_SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PATH, "w") as token:
-            token.write(creds.to_json())
-    return build("gmail", "v1", credentials=creds, cache_discovery=False)
+        return False
+    return creds.expiry is None or (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() > margin_s
+
+def _gmail_save_token(creds):
+    """Write token.json atomically so a crash or a concurrent reader never sees half a file."""
+    folder = os.path.dirname(os.path.abspath(TOKEN_PATH))
+    fd, tmp = tempfile.mkstemp(prefix=".token-", suffix=".json", dir=folder)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(creds.to_json())
+        os.replace(tmp, TOKEN_PATH)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+def _gmail_credentials():
+    global _GMAIL_CREDS
+    creds = _GMAIL_CREDS
+    if _gmail_creds_fresh(creds):
+        return creds
+    with _GMAIL_LOCK:
+        creds = _GMAIL_CREDS
+        if _gmail_creds_fresh(creds):
+            return creds
+        if creds is None and os.path.exists(TOKEN_PATH):
+            creds = Credentials.from_authorized_user_file(TOKEN_PATH, GMAIL_SCOPES)
+        if not _gmail_creds_fresh(creds):
+            if creds and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                if not os.path.exists(CRED_PATH):
+                    raise RuntimeError(f"credentials.json not found at: {CRED_PATH}. Set GMAIL_CREDENTIALS_PATH or place the file there.")
+                flow = InstalledAppFlow.from_client_secrets_file(CRED_PATH, GMAIL_SCOPES)
+                creds = flow.run_local_server(port=0)
+            _gmail_save_token(creds)
+        _GMAIL_CREDS = creds
+        _gmail_start_refresher()
+        return creds
+
+def _gmail_refresh_loop():
+    while True:
+        creds = _GMAIL_CREDS
+        wait = 60.0
+        if creds is not None and creds.expiry is not None:
+            wait = (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() - GMAIL_REFRESH_MARGIN_S
+        if wait > 0:
+            time.sleep(min(wait, 3600.0))
+            continue
+        try:
+            with _GMAIL_LOCK:
+                creds = _GMAIL_CREDS
+                if creds is not None and creds.refresh_token and not _gmail_creds_fresh(creds):
+                    creds.refresh(Request())
+                    _gmail_save_token(creds)
+                    _stat_inc("gmail_token_refreshes")
+            if creds is None or not creds.refresh_token:
+                return
+        except Exception as e:
+            app.logger.warning(f"Gmail token refresh failed ({e}); retrying in 60s")
+            time.sleep(60.0)
+
+def _gmail_start_refresher():
+    global _GMAIL_REFRESHER
+    with _GMAIL_LOCK:
+        if _GMAIL_REFRESHER is None or not _GMAIL_REFRESHER.is_alive():
+            _GMAIL_REFRESHER = threading.Thread(target=_gmail_refresh_loop, name="gmail-token-refresh", daemon=True)
+            _GMAIL_REFRESHER.start()
+
+def _gmail_thread_http():
+    """This thread's authorized connection (recreated if the credentials object was replaced)."""
+    creds = _gmail_credentials()
+    cached = getattr(_GMAIL_HTTP, "value", None)
+    if cached is None or cached[0] is not creds:
+        cached = (creds, google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=30)))
+        _GMAIL_HTTP.value = cached
+    return cached[1]
+
+def _gmail_request_builder(http, *args, **kwargs):
+    return HttpRequest(_gmail_thread_http(), *args, **kwargs)
+
+def _gmail_service():
+    global _GMAIL_SVC
+    svc = _GMAIL_SVC
+    if svc is not None:
+        return svc
+    with _GMAIL_LOCK:
+        if _GMAIL_SVC is None:
+            opts = {"api_endpoint": GMAIL_API_ENDPOINT} if GMAIL_API_ENDPOINT else None
+            _GMAIL_SVC = build("gmail", "v1", credentials=_gmail_credentials(), cache_discovery=False,
+                               requestBuilder=_gmail_request_builder, client_options=opts)
+            _stat_inc("gmail_service_builds")
+        return _GMAIL_SVC
+
+def _gmail_warmup():
+    """Load token.json and build the client at startup; without a token, consent waits for first use."""
+    if not os.path.exists(TOKEN_PATH):
+        return
+    try:
+        _gmail_service()
+    except Exception as e:
+        app.logger.warning(f"Gmail client not ready at startup: {e}")
+
+_GMAIL_POOL = ThreadPoolExecutor(max_workers=max(1, GMAIL_CONCURRENCY), thread_name_prefix="gmail")
+
+def _gmail_new_batch(callback):
+    if GMAIL_API_ENDPOINT:
+        return BatchHttpRequest(callback=callback, batch_uri=f"{GMAIL_API_ENDPOINT}/batch/gmail/v1")
+    return _gmail_service().new_batch_http_request(callback=callback)
+
+def _gmail_get_batched(ids: list, **get_args) -> dict:
+    svc = _gmail_service()
+    found = {}
+    def collect(request_id, response, exception):
+        if exception is None and response:
+            found[request_id] = response
+    for start in range(0, len(ids), GMAIL_BATCH_SIZE):
+        chunk = ids[start:start + GMAIL_BATCH_SIZE]
+        batch = _gmail_new_batch(collect)
+        for msg_id in chunk:
+            batch.add(svc.users().messages().get(userId="me", id=msg_id, **get_args), request_id=msg_id)
+        try:
+            batch.execute()
+        except Exception as e:
+            # whole batch refused (proxy without multipart support, 5xx): fetch this chunk one by one instead
+            app.logger.warning(f"Gmail batch request failed ({e}); fetching {len(chunk)} messages concurrently")
+            _stat_inc("gmail_batch_fallbacks")
+            found.update(_gmail_get_threaded(chunk, **get_args))
+    return found
+
+def _gmail_get_one(msg_id: str, **get_args):
+    try:
+        return _gmail_service().users().messages().get(userId="me", id=msg_id, **get_args).execute()
+    except Exception:
+        return None
+
+def _gmail_get_threaded(ids: list, **get_args) -> dict:
+    futures = {msg_id: _GMAIL_POOL.submit(_gmail_get_one, msg_id, **get_args) for msg_id in ids}
+    results = {msg_id: fut.result() for msg_id, fut in futures.items()}
+    return {msg_id: m for msg_id, m in results.items() if m}
+
+def _gmail_get_messages(ids: list, **get_args) -> list:
+    """
+    messages.get for every id, in the order given. Messages that fail are
+    skipped. GMAIL_FETCH_MODE picks batch requests, the worker pool or one
+    request after another.
+    """
+    ids = list(dict.fromkeys(i for i in ids if i))
+    if not ids:
+        return []
+    t0 = time.perf_counter()
+    if GMAIL_FETCH_MODE == "sequential" or len(ids) == 1:
+        found = {i: m for i in ids for m in [_gmail_get_one(i, **get_args)] if m}
+    elif GMAIL_FETCH_MODE == "threads":
+        found = _gmail_get_threaded(ids, **get_args)
+    else:
+        found = _gmail_get_batched(ids, **get_args)
+    _stat_inc("gmail_messages_fetched", len(found))
+    _stat_inc("gmail_messages_skipped", len(ids) - len(found))
+    _stat_inc("gmail_fetches")
+    _stat_inc("gmail_fetch_ms", int((time.perf_counter() - t0) * 1000))
+    return [found[i] for i in ids if i in found]
 
 def _gmail_recent(n=10):
     svc = _gmail_service()
     msgs = svc.users().messages().list(userId="me", labelIds=["INBOX"], maxResults=n).execute().get("messages", [])
     out = []
-    for m in msgs:
-        full = svc.users().messages().get(userId="me", id=m["id"], format="metadata", metadataHeaders=["From","Subject","Date"]).execute()
+    for full in _gmail_get_messages([m["id"] for m in msgs], format="metadata", metadataHeaders=["From","Subject","Date"]):
         hdrs = {h["name"].lower(): h["value"] for h in full.get("payload", {}).get("headers", [])}
         out.append({
-            "id": m["id"],
+            "id": full.get("id"),
             "threadId": full.get("threadId"),
             "from": hdrs.get("from",""),
             "subject": hdrs.get("subject",""),
@@ -416,8 +1425,7 @@ def _draft_email_with_context(user_prompt: str):
     )
     txt = resp.choices[0].message.content
     try:
-        start, end = txt.find("{"), txt.rfind("}")
-        draft = json.loads(txt[start:end+1]) if start!=-1 and end!=-1 else json.loads(txt)
+        draft = _coerce_json_from_text(txt)
         to_list = draft.get("to") or []
         if isinstance(to_list, str):
             to_list = [to_list]
@@ -441,9 +1449,8 @@ def _gmail_search(query: str, n: int = 25):
     resp = svc.users().messages().list(userId="me", q=query, maxResults=n).execute()
     return resp.get("messages", [])
 
-def _gmail_get_full_message(msg_id: str):
-    svc = _gmail_service()
-    m = svc.users().messages().get(userId="me", id=msg_id, format="full").execute()
+def _gmail_parse_message(m: dict):
+    """A format=full messages.get resource -> {id, from, subject, date, snippet, body}."""
     payload = m.get("payload", {})
     headers = {h["name"].lower(): h["value"] for h in payload.get("headers", [])}
 
@@ -500,9 +1507,9 @@ def _gmail_get_full_message(msg_id: str):
 def _gmail_fetch_messages(query: str, limit: int = 25):
     ids = _gmail_search(query, n=min(limit, 30))
     out = []
-    for item in ids[:limit]:
+    for m in _gmail_get_messages([item["id"] for item in ids[:limit]], format="full"):
         try:
-            out.append(_gmail_get_full_message(item["id"]))
+            out.append(_gmail_parse_message(m))
         except Exception:
             continue
     return out
@@ -524,9 +1531,7 @@ def _extractive_summary(messages: list) -> str:
         bullets.append(f"- {m.get('date','')}: {m.get('subject','(no subject)')}")
     return "\n".join(bullets)
 
-def _summarize_emails_with_llm(messages: list, user_request: str = "", timeout_s: int = 20):
-    if not llm_client:
-        return False, "LLM disabled: FASTR_API_KEY not set."
+def _summarize_messages_for_llm(messages: list, user_request: str = "") -> list:
     def clip(s, n=800):
         return (s[:n] + "…") if len(s) > n else s
     bundle = []
@@ -547,23 +1552,20 @@ def _summarize_emails_with_llm(messages: list, user_request: str = "", timeout_s
         )
     }
     usr = {"role": "user", "content": f"{user_request}\n\nEmails:\n{context}"}
-    result = {"ok": False, "text": None, "err": None}
-    def run():
-        try:
-            resp = llm_client.chat.completions.create(
-                model=LLM_MODEL, messages=[sys, usr], temperature=0.2, max_tokens=600
-            )
-            result["ok"] = True
-            result["text"] = resp.choices[0].message.content.strip()
-        except Exception as e:
-            result["err"] = str(e)
-    t = threading.Thread(target=run, daemon=True)
-    t.start()
-    t.join(timeout_s)
-    if not result["ok"]:
-        fb = _extractive_summary(messages)
-        return True, fb
-    return True, result["text"]
+    return [sys, usr]
+
+def _summarize_emails_with_llm(messages: list, user_request: str = "", timeout_s: int = 20):
+    if not llm_client:
+        return False, "LLM disabled: FASTR_API_KEY not set."
+    try:
+        # the deadline is the HTTP client's own; no extra thread to wait on
+        resp = llm_client.with_options(timeout=timeout_s, max_retries=0).chat.completions.create(
+            model=LLM_MODEL, messages=_summarize_messages_for_llm(messages, user_request), temperature=0.2, max_tokens=600
+        )
+        return True, resp.choices[0].message.content.strip()
+    except Exception as e:
+        app.logger.warning("Email summary via LLM failed (%s); using extractive summary", e)
+        return True, _extractive_summary(messages)
 
 def _sender_to_query(sender: str) -> str:
     s = (sender or "").strip().lower()
@@ -607,6 +1609,8 @@ def _parse_date_range_from_text(text: str):
     }
 
 # ---------------- Google Search ----------------
+GOOGLE_CSE_URL = "https://www.googleapis.com/customsearch/v1"
+
 def _google_search(query: str, k: int = SEARCH_MAX_RESULTS):
     """
     Returns (ok, results_or_error). results_or_error is a list of dicts:
@@ -614,30 +1618,30 @@ def _google_search(query: str, k: int = SEARCH_MAX_RESULTS):
     """
     if not GOOGLE_API_KEY or not GOOGLE_CSE_ID:
         return False, "Google search is not configured. Set GOOGLE_API_KEY and GOOGLE_CSE_ID."
-    k = max(1, min(int(k or 5), 10))
     try:
-        r = requests.get(
-            "https://www.googleapis.com/customsearch/v1",
-            params={"key": GOOGLE_API_KEY, "cx": GOOGLE_CSE_ID, "q": query, "num": k},
-            timeout=10,
-        )
+        r = requests.get(GOOGLE_CSE_URL, params=_google_search_params(query, k), timeout=10)
         if r.status_code != 200:
             return False, f"Google CSE error {r.status_code}: {r.text[:200]}"
-        data = r.json()
-        items = data.get("items", []) or []
-        results = []
-        for it in items:
-            results.append({
-                "title": it.get("title", "").strip(),
-                "link": it.get("link", ""),
-                "snippet": (it.get("snippet") or it.get("htmlSnippet") or "").strip(),
-                "displayLink": it.get("displayLink", ""),
-            })
-        return True, results
+        return True, _google_search_results(r.json())
     except Exception as e:
         app.logger.exception("Google CSE call failed")
         return False, f"Search failed: {e}"
 
+def _google_search_params(query: str, k: int) -> dict:
+    k = max(1, min(int(k or 5), 10))
+    return {"key": GOOGLE_API_KEY, "cx": GOOGLE_CSE_ID, "q": query, "num": k}
+
+def _google_search_results(data: dict) -> list:
+    results = []
+    for it in data.get("items", []) or []:
+        results.append({
+            "title": it.get("title", "").strip(),
+            "link": it.get("link", ""),
+            "snippet": (it.get("snippet") or it.get("htmlSnippet") or "").strip(),
+            "displayLink": it.get("displayLink", ""),
+        })
+    return results
+
 def _render_search_results_text(query: str, results: list) -> str:
     """Plain text (good for TTS)."""
     if not results:
@@ -837,27 +1841,8 @@ def _plan_desktop_instruction(instr):
     }
     usr = {"role": "user", "content": instr}
 
-    raw = ""
     try:
-        try:
-            r = llm_client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[sys, usr],
-                temperature=0.2,
-                max_tokens=500,
-                response_format={"type": "json_object"},
-            )
-            raw = r.choices[0].message.content or ""
-            j = json.loads(raw)
-        except Exception:
-            r = llm_client.chat.completions.create(
-                model=LLM_MODEL,
-                messages=[sys, usr],
-                temperature=0.2,
-                max_tokens=500,
-            )
-            raw = r.choices[0].message.content or ""
-            j = _coerce_json_from_text(raw)
+        j, _ = _llm_json_completion([sys, usr], temperature=0.2, max_tokens=500)
 
         if not isinstance(j, dict):
             return True, _rule_plan(instr)
@@ -991,6 +1976,228 @@ def _explorer_open_path(path: str, new_window: bool = EXPLORER_NEW_WINDOW):
         return False, f"explorer launch failed: {e}"
 
 
+# ---------------- email drafts ----------------
+def _email_draft(prompt: str = "", to=None, subject=None, body=None):
+    """
+    Stage CURRENT_DRAFT and open Gmail compose. The LLM writes the draft
+    unless to, subject and body are all given. Returns (payload, status).
+    """
+    if not (to and subject and body):
+        ok, draft = _draft_email_with_context(prompt or "Compose an email.")
+        if not ok:
+            return {"ok": False, "error": draft}, 500
+        to_list, subject, body = draft["to"], draft["subject"], draft["body"]
+    else:
+        to_list = to if isinstance(to, list) else [to]
+    CURRENT_DRAFT.clear()
+    CURRENT_DRAFT.update({"to": to_list, "subject": subject, "body": body, "opened_compose": False})
+    msg = _open_gmail_compose(to_list, subject, body)
+    CURRENT_DRAFT["opened_compose"] = True if not msg.startswith("(") else False
+    return {"ok": True, "draft": CURRENT_DRAFT, "message": msg, "opened_compose": CURRENT_DRAFT["opened_compose"]}, 200
+
+def _email_send():
+    """Send the staged draft. Returns (payload, status)."""
+    if not CURRENT_DRAFT:
+        return {"ok": False, "error": "No draft staged."}, 400
+    try:
+        msg_id = _gmail_send(CURRENT_DRAFT.get("to"), CURRENT_DRAFT.get("subject"), CURRENT_DRAFT.get("body"))
+        sent_info = {"messageId": msg_id}
+        CURRENT_DRAFT.clear()
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text":"Email sent.", "time": time.time()})
+        return {"ok": True, "sent": sent_info, "message": "Email sent via Gmail API."}, 200
+    except Exception as e:
+        app.logger.exception("Send failed")
+        return {"ok": False, "error": f"Send failed: {e}"}, 500
+
+def _email_discard():
+    CURRENT_DRAFT.clear()
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text":"Draft discarded.", "time": time.time()})
+    return {"ok": True, "message": "Draft discarded."}, 200
+
+# ---------------- intent handlers ----------------
+def _search_reply(q: str, reply_text: str, result):
+    """(payload, status) for a web_search intent from _google_search's (ok, results_or_err)."""
+    ok_s, results_or_err = result
+    if not ok_s:
+        msg = f"{reply_text or 'Could not search.'} ({results_or_err})"
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": msg, "time": time.time()})
+        return {"ok": False, "message": msg}, 500
+    md = _render_search_results_markdown(q, results_or_err)
+    tts = _render_search_results_text(q, results_or_err)
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": reply_text or "Here’s what I found:", "time": time.time()})
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": md, "time": time.time()})
+    return {
+        "ok": True,
+        "message": reply_text or "Here’s what I found:",
+        "query": q,
+        "results": results_or_err,
+        "readable": tts,
+        "markdown": md
+    }, 200
+
+def _summary_reply(q: str, reply_text: str, messages: list, ok_s: bool, summary: str):
+    """(payload, status) for a summarize_emails intent once the messages are summarized."""
+    if not ok_s:
+        return {"ok": False, "message": summary}, 500
+    intro = reply_text or "Here you go."
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": intro, "time": time.time()})
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": summary, "time": time.time()})
+    return {"ok": True, "message": intro, "query": q, "count": len(messages), "summary": summary}, 200
+
+# intent -> fn(prompt, resp, sync=False, prefetch=None) -> (json_payload, status)
+INTENT_HANDLERS = {}
+
+def intent_handler(*intents, registry=INTENT_HANDLERS):
+    """Register the decorated function as the handler for these intents."""
+    def register(fn):
+        for name in intents:
+            registry[name] = fn
+        return fn
+    return register
+
+def _dispatch_intent(prompt: str, resp: dict, sync: bool = False, prefetch: dict = None):
+    """
+    Carry out a parsed intent. Returns (json_payload, status). Intents without
+    a handler are answered as chat. Work already started while the intent
+    streamed in (prefetch) is picked up by the handlers.
+    """
+    handler = INTENT_HANDLERS.get(resp.get("intent")) or INTENT_HANDLERS["chat"]
+    try:
+        return handler(prompt, resp, sync=sync, prefetch=prefetch)
+    except PrefetchConflict as e:
+        app.logger.warning(str(e))
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": str(e), "time": time.time()})
+        return {"ok": False, "error": str(e)}, 409
+
+def _payload_text(payload: dict) -> str:
+    """Plain-text form of a dispatch payload, for the minimal HTML page."""
+    text = payload.get("message") or payload.get("error") or ""
+    extra = payload.get("readable") or payload.get("summary")
+    if extra:
+        text = f"{text}\n\n{extra}"
+    listed = payload.get("result")
+    if isinstance(listed, dict):
+        text = _listing_text(text, listed)
+    return text
+
+def _listing_text(reply: str, listed: dict) -> str:
+    """A desktop_task reply followed by the folders/files it listed ("(none)" for an empty list)."""
+    folders, files = listed.get("folders"), listed.get("files")
+    lines = [reply]
+    if folders is not None:
+        lines.append("Folders: " + (", ".join(folders) if folders else "(none)"))
+    if files is not None:
+        lines.append("Files: " + (", ".join(files) if files else "(none)"))
+    if folders is None and files is None:
+        items = listed.get("all") or []
+        lines.append("Items: " + (", ".join(items) if items else "(none)"))
+    return "\n".join(lines)
+
+@intent_handler("chat")
+def _handle_chat(prompt, resp, sync=False, prefetch=None):
+    reply_text = resp.get("reply") or ""
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": reply_text, "time": time.time()})
+    return {"ok": True, "message": reply_text}, 200
+
+@intent_handler("web_search")
+def _handle_web_search(prompt, resp, sync=False, prefetch=None):
+    q, k = _search_args(prompt, resp)
+    return _search_reply(q, resp.get("reply") or "", _prefetched(prefetch, "web_search", (q, k), _google_search))
+
+@intent_handler("scroll_reels")
+def _handle_scroll_reels(prompt, resp, sync=False, prefetch=None):
+    reply_text = resp.get("reply") or ""
+    def bg_scroll():
+        success_bg, msg_bg = _open_instagram_reels_and_autoscroll()
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot", "text": f"{reply_text} ({msg_bg})", "time": time.time()})
+    threading.Thread(target=bg_scroll, daemon=True).start()
+    return {
+        "ok": True,
+        "message": f"{reply_text} (Opening Instagram Reels and auto-scrolling every {REELS_SCROLL_INTERVAL}s for {REELS_SCROLL_STEPS} steps)"
+    }, 202
+
+@intent_handler("stop_reels")
+def _handle_stop_reels(prompt, resp, sync=False, prefetch=None):
+    reply_text = resp.get("reply") or ""
+    REELS_CANCEL.set()
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": reply_text or "Stopping reels.", "time": time.time()})
+    return {"ok": True, "message": reply_text or "Stopping reels."}, 200
+
+@intent_handler("compose_email")
+def _handle_compose_email(prompt, resp, sync=False, prefetch=None):
+    j, _ = _email_draft(prompt, resp.get("to"), resp.get("subject"), resp.get("body"))
+    if not j.get("ok"):
+        return {"ok": False, "message": j.get("error", "draft failed")}, 500
+    draft, msg = j["draft"], j.get("message", "")
+    reply = resp.get("reply") or "Draft ready."
+    preview = ["Draft staged:", f"To: {', '.join(draft.get('to', []))}", f"Subject: {draft.get('subject','')}", "", draft.get("body","")]
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot", "text": reply, "time": time.time()})
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot", "text": "\n".join(preview), "time": time.time()})
+    return {"ok": True, "message": f"{reply} ({msg})", "draft": draft, "needs_confirmation": True}, 200
+
+@intent_handler("send_email")
+def _handle_send_email(prompt, resp, sync=False, prefetch=None):
+    return _email_send()
+
+@intent_handler("discard_email")
+def _handle_discard_email(prompt, resp, sync=False, prefetch=None):
+    return _email_discard()
+
+@intent_handler("summarize_emails")
+def _handle_summarize_emails(prompt, resp, sync=False, prefetch=None):
+    q, limit = _summarize_query(prompt, resp)
+    if not q:
+        return {"ok": False, "message": "Need sender or query to summarize."}, 400
+    try:
+        t0 = time.time()
+        messages = _prefetched(prefetch, "summarize_emails", (q, limit), _gmail_fetch_messages)
+        fetch_ms = int((time.time()-t0)*1000)
+        t1 = time.time()
+        ok_s, summary = _summarize_emails_with_llm(messages, user_request=f"Summarize {q}", timeout_s=20)
+        sum_ms = int((time.time()-t1)*1000)
+        app.logger.info(f"Summarize: fetched {len(messages)} in {fetch_ms}ms; summarized in {sum_ms}ms")
+        return _summary_reply(q, resp.get("reply") or "", messages, ok_s, summary)
+    except Exception as e:
+        app.logger.exception("Summarize via router failed")
+        return {"ok": False, "message": f"Summarize failed: {e}"}, 500
+
+@intent_handler("desktop_task")
+def _handle_desktop_task(prompt, resp, sync=False, prefetch=None):
+    instruction = resp.get("instruction") or prompt
+    ok_plan, plan_or_err, executed = _prefetched(prefetch, "desktop_task", (instruction,), _run_desktop_instruction)
+    if not ok_plan:
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": plan_or_err,"time": time.time()})
+        return {"ok": False, "error": plan_or_err}, 500
+    exec_ok, logs, listed, err = executed
+    if not exec_ok:
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": err,"time": time.time()})
+        return {"ok": False, "plan": plan_or_err, "logs": logs, "error": err}, 500
+    reply = resp.get("reply") or "Done."
+    text = _listing_text(reply, listed) if isinstance(listed, dict) else reply
+    _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": text,"time": time.time()})
+    return {"ok": True, "message": reply, "plan": plan_or_err, "logs": logs, "result": listed}, 200
+
+@intent_handler("open_app")
+def _handle_open_app(prompt, resp, sync=False, prefetch=None):
+    app_name = resp.get("app")
+    reply_text = resp.get("reply") or ""
+    if not app_name:
+        return _handle_chat(prompt, resp)
+    if sync:
+        success, msg = _prefetched(prefetch, "open_app", (app_name,), _open_app_by_name_from_llm)
+        full_reply = f"{reply_text} ({msg})"
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": full_reply, "time": time.time()})
+        return {"ok": success, "message": full_reply}, (200 if success else 500)
+    def bg_open(name):
+        try:
+            success_bg, msg_bg = _prefetched(prefetch, "open_app", (name,), _open_app_by_name_from_llm)
+        except PrefetchConflict as e:
+            app.logger.warning(str(e))
+            msg_bg = str(e)
+        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": f"{reply_text} ({msg_bg})", "time": time.time()})
+    threading.Thread(target=bg_open, args=(app_name,), daemon=True).start()
+    return {"ok": True, "message": f"{reply_text} (Opening queued: {app_name})"}, 202
+
 # ---------------- Routes ----------------
 @app.route("/", methods=["GET"])
 def index():
@@ -1004,84 +2211,13 @@ def open_route():
     user_entry = {"id": f"u-{int(time.time()*1000)}", "sender": "user", "text": prompt, "time": time.time()}
     _add_history_entry(user_entry)
 
-    ok, resp = _ask_llm_for_intent(prompt, CHAT_HISTORY)
+    ok, resp = _ask_llm_for_intent(prompt, CHAT_HISTORY.recent())
     if not ok:
         bot_entry = {"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": resp, "time": time.time()}
         _add_history_entry(bot_entry)
         return render_template_string(HTML, result=resp)
-
-    intent = resp.get("intent")
-    app_name = resp.get("app")
-    reply_text = resp.get("reply") or ""
-
-    if intent == "web_search":
-        q = (resp.get("search_query") or prompt or "").strip()
-        k = int(resp.get("k") or SEARCH_MAX_RESULTS)
-        ok_s, results_or_err = _google_search(q, k=k)
-        if not ok_s:
-            msg = f"{reply_text or 'Could not search.'} ({results_or_err})"
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": msg,"time": time.time()})
-            return render_template_string(HTML, result=msg)
-        md = _render_search_results_markdown(q, results_or_err)
-        tts = _render_search_results_text(q, results_or_err)
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": reply_text or "Here’s what I found:", "time": time.time()})
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": md, "time": time.time()})
-        # The minimal HTML page shows plain text; your SPA will render markdown via /api/open
-        return render_template_string(HTML, result=f"{reply_text or 'Here’s what I found:'}\n\n{tts}")
-
-    if intent == "scroll_reels":
-        def bg_scroll():
-            success_bg, msg_bg = _open_instagram_reels_and_autoscroll()
-            bot_entry_bg = {
-                "id": f"b-{int(time.time()*1000)}",
-                "sender": "bot",
-                "text": f"{reply_text} ({msg_bg})",
-                "time": time.time(),
-            }
-            _add_history_entry(bot_entry_bg)
-        threading.Thread(target=bg_scroll, daemon=True).start()
-        start_msg = f"{reply_text} (Starting Instagram Reels autoscroll every {REELS_SCROLL_INTERVAL}s for {REELS_SCROLL_STEPS} steps)"
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": start_msg, "time": time.time()})
-        return render_template_string(HTML, result=start_msg)
-
-    if intent == "stop_reels":
-        REELS_CANCEL.set()
-        msg = reply_text or "Stopping reels autoscroll."
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": msg, "time": time.time()})
-        return render_template_string(HTML, result=msg)
-
-    if intent == "desktop_task":
-        instruction = resp.get("instruction") or prompt
-        ok_plan, plan_or_err = _plan_desktop_instruction(instruction)
-        if not ok_plan:
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": plan_or_err,"time": time.time()})
-            return render_template_string(HTML, result=plan_or_err)
-        exec_ok, logs, listed, err = _execute_desktop_plan(plan_or_err)
-        if not exec_ok:
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": err,"time": time.time()})
-            return render_template_string(HTML, result=err)
-        reply = resp.get("reply") or "Done."
-        folders = listed.get("folders")
-        files = listed.get("files")
-        lines = [reply]
-        if folders is not None:
-            lines.append("Folders: " + (", ".join(folders) if folders else "(none)"))
-        if files is not None:
-            lines.append("Files: " + (", ".join(files) if files else "(none)"))
-        if folders is None and files is None:
-            items = listed.get("all") or []
-            lines.append("Items: " + (", ".join(items) if items else "(none)"))
-        text_out = "\n".join(lines)
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": text_out,"time": time.time()})
-        return render_template_string(HTML, result=text_out)
-
-    if intent == "open_app" and app_name:
-        success, msg = _open_app_by_name_from_llm(app_name)
-        full_reply = f"{reply_text} ({msg})"
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": full_reply, "time": time.time()})
-        return render_template_string(HTML, result=full_reply)
-    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": reply_text, "time": time.time()})
-    return render_template_string(HTML, result=reply_text)
+    payload, _ = _dispatch_intent(prompt, resp, sync=True)
+    return render_template_string(HTML, result=_payload_text(payload))
 
 @app.route("/api/open", methods=["POST", "OPTIONS"])
 def open_api():
@@ -1097,150 +2233,70 @@ def open_api():
         return jsonify({"ok": False, "error": "no prompt provided"}), 400
 
     _add_history_entry({"id": f"u-{int(time.time()*1000)}", "sender": "user", "text": prompt, "time": time.time()})
-    ok, resp = _ask_llm_for_intent(prompt, CHAT_HISTORY)
+    prefetch = {}
+    ok, resp = _ask_llm_for_intent(prompt, CHAT_HISTORY.recent(), prefetch)
     if not ok:
         _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": resp, "time": time.time()})
         return jsonify({"ok": False, "message": resp}), 500
+    payload, status = _dispatch_intent(prompt, resp, sync=request.args.get("sync") == "1", prefetch=prefetch)
+    return jsonify(payload), status
 
-    intent = resp.get("intent")
-    app_name = resp.get("app")
-    reply_text = resp.get("reply") or ""
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-    if intent == "web_search":
-        q = (resp.get("search_query") or prompt or "").strip()
-        k = int(resp.get("k") or SEARCH_MAX_RESULTS)
-        ok_s, results_or_err = _google_search(q, k=k)
-        if not ok_s:
-            msg = f"{reply_text or 'Could not search.'} ({results_or_err})"
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": msg, "time": time.time()})
-            return jsonify({"ok": False, "message": msg}), 500
-        md = _render_search_results_markdown(q, results_or_err)
-        tts = _render_search_results_text(q, results_or_err)
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": reply_text or "Here’s what I found:", "time": time.time()})
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": md, "time": time.time()})
-        return jsonify({
-            "ok": True,
-            "message": reply_text or "Here’s what I found:",
-            "query": q,
-            "results": results_or_err,
-            "readable": tts,
-            "markdown": md
-        }), 200
-
-    if intent == "scroll_reels":
-        def bg_scroll():
-            success_bg, msg_bg = _open_instagram_reels_and_autoscroll()
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot", "text": f"{reply_text} ({msg_bg})", "time": time.time()})
-        threading.Thread(target=bg_scroll, daemon=True).start()
-        return jsonify({
-            "ok": True,
-            "message": f"{reply_text} (Opening Instagram Reels and auto-scrolling every {REELS_SCROLL_INTERVAL}s for {REELS_SCROLL_STEPS} steps)"
-        }), 202
-
-    if intent == "stop_reels":
-        REELS_CANCEL.set()
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": reply_text or "Stopping reels.", "time": time.time()})
-        return jsonify({"ok": True, "message": reply_text or "Stopping reels."}), 200
-
-    if intent == "compose_email":
-        payload = {"prompt": prompt, "to": resp.get("to"), "subject": resp.get("subject"), "body": resp.get("body")}
-        with app.test_request_context():
-            with app.test_client() as c:
-                r = c.post("/api/email/draft", json=payload, headers={"X-API-Key": API_KEY} if API_KEY else {})
-                j = r.get_json()
-                if r.status_code != 200 or not j.get("ok"):
-                    return jsonify({"ok": False, "message": j.get("error","draft failed")}), 500
-                draft = j["draft"]; msg = j.get("message","")
-        reply = reply_text or "Draft ready."
-        preview = ["Draft staged:", f"To: {', '.join(draft.get('to', []))}", f"Subject: {draft.get('subject','')}", "", draft.get("body","")]
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot", "text": reply, "time": time.time()})
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot", "text": "\n".join(preview), "time": time.time()})
-        return jsonify({"ok": True, "message": f"{reply} ({msg})", "draft": draft, "needs_confirmation": True}), 200
-
-    if intent == "send_email":
-        with app.test_request_context():
-            with app.test_client() as c:
-                r = c.post("/api/email/send", headers={"X-API-Key": API_KEY} if API_KEY else {})
-                j = r.get_json()
-                code = 200 if j.get("ok") else 500
-                if j.get("ok"):
-                    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text":"Email sent.", "time": time.time()})
-                return jsonify(j), code
-
-    if intent == "discard_email":
-        with app.test_request_context():
-            with app.test_client() as c:
-                r = c.post("/api/email/discard", headers={"X-API-Key": API_KEY} if API_KEY else {})
-                j = r.get_json()
-                code = 200 if j.get("ok") else 500
-                if j.get("ok"):
-                    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text":"Draft discarded.", "time": time.time()})
-                return jsonify(j), code
+@app.route("/api/open/stream", methods=["POST", "OPTIONS"])
+def open_stream_api():
+    """
+    /api/open as server-sent events. For chat replies the text goes out as
+    "delta" events ({"text": ...}) while the model is still writing it; the
+    final "done" event carries exactly what /api/open would have returned,
+    plus "status".
+    """
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True}), 200
+    ok_req, errmsg = _require_api_key(request)
+    if not ok_req:
+        return jsonify({"ok": False, "error": errmsg}), 401
 
-    if intent == "summarize_emails":
-        q = (resp.get("query") or "").strip()
-        sender = (resp.get("sender") or "").strip()
-        limit = int(resp.get("limit") or 15)
-        if not q:
-            if not sender:
-                return jsonify({"ok": False, "message": "Need sender or query to summarize."}), 400
-            q = _sender_to_query(sender)
-        rng = _parse_date_range_from_text(prompt)
-        if rng:
-            q = f"{q} after:{rng['after']} before:{rng['before']}"
-        else:
-            if "newer_than:" not in q and "after:" not in q and "before:" not in q:
-                q = f"{q} newer_than:30d"
-        try:
-            t0 = time.time()
-            messages = _gmail_fetch_messages(q, limit=limit)
-            fetch_ms = int((time.time()-t0)*1000)
-            t1 = time.time()
-            ok_s, summary = _summarize_emails_with_llm(messages, user_request=f"Summarize {q}", timeout_s=20)
-            sum_ms = int((time.time()-t1)*1000)
-            app.logger.info(f"Summarize: fetched {len(messages)} in {fetch_ms}ms; summarized in {sum_ms}ms")
-            if not ok_s:
-                return jsonify({"ok": False, "message": summary}), 500
-            intro = reply_text or "Here you go."
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": intro, "time": time.time()})
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": summary, "time": time.time()})
-            return jsonify({"ok": True, "message": intro, "query": q, "count": len(messages), "summary": summary}), 200
-        except Exception as e:
-            app.logger.exception("Summarize via router failed")
-            return jsonify({"ok": False, "message": f"Summarize failed: {e}"}), 500
-
-    if intent == "desktop_task":
-        instruction = resp.get("instruction") or prompt
-        ok_plan, plan_or_err = _plan_desktop_instruction(instruction)
-        if not ok_plan:
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": plan_or_err,"time": time.time()})
-            return jsonify({"ok": False, "error": plan_or_err}), 500
-        exec_ok, logs, listed, err = _execute_desktop_plan(plan_or_err)
-        if not exec_ok:
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": err,"time": time.time()})
-            return jsonify({"ok": False, "plan": plan_or_err, "logs": logs, "error": err}), 500
-        reply = resp.get("reply") or "Done."
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": reply,"time": time.time()})
-        return jsonify({"ok": True, "message": reply, "plan": plan_or_err, "logs": logs, "result": listed}), 200
-
-
-    if intent == "open_app" and app_name:
-        sync = request.args.get("sync") == "1"
-        if sync:
-            success, msg = _open_app_by_name_from_llm(app_name)
-            full_reply = f"{reply_text} ({msg})"
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": full_reply, "time": time.time()})
-            return jsonify({"ok": success, "message": full_reply}), (200 if success else 500)
-        def bg_open(name, prompt_text):
-            success_bg, msg_bg = _open_app_by_name_from_llm(name)
-            _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": f"{reply_text} ({msg_bg})", "time": time.time()})
-        t = threading.Thread(target=bg_open, args=(app_name, prompt), daemon=True)
-        t.start()
-        return jsonify({"ok": True, "message": f"{reply_text} (Opening queued: {app_name})"}), 202
-
-    # default chat
-    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": reply_text, "time": time.time()})
-    return jsonify({"ok": True, "message": reply_text}), 200
+    data = request.get_json(force=True, silent=True) or {}
+    prompt = (data.get("prompt") or "").strip()
+    if not prompt:
+        return jsonify({"ok": False, "error": "no prompt provided"}), 400
+    sync = request.args.get("sync") == "1"
+
+    _add_history_entry({"id": f"u-{int(time.time()*1000)}", "sender": "user", "text": prompt, "time": time.time()})
+
+    def events():
+        ok, resp, prefetch = True, None, {}
+        history = CHAT_HISTORY.recent()
+        if LOCAL_INTENT or INTENT_CACHE:
+            resp = _quick_intent(prompt, history)
+        if resp is None:
+            if not llm_client:
+                ok, resp = False, "LLM disabled: FASTR_API_KEY not set (FastRouter only)."
+            else:
+                try:
+                    for kind, value in _stream_llm_intent(prompt, history, prefetch):
+                        if kind == "delta":
+                            yield _sse("delta", {"text": value})
+                        else:
+                            resp = value
+                    _remember_intent(prompt, history, resp)
+                except LLMParseError as e:
+                    app.logger.warning("JSON parse failed; raw=%r", e.raw)
+                    ok, resp = False, f"LLM responded but JSON parse failed. Raw: {e.raw}"
+                except Exception as e:
+                    app.logger.warning("LLM intent stream failed: %s", e)
+                    ok, resp = False, f"LLM call failed: {e}"
+        if not ok:
+            _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": resp, "time": time.time()})
+            yield _sse("done", {"ok": False, "message": resp, "status": 500})
+            return
+        payload, status = _dispatch_intent(prompt, resp, sync=sync, prefetch=prefetch)
+        yield _sse("done", {**payload, "status": status})
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/api/history", methods=["GET"])
 def api_history():
@@ -1248,14 +2304,54 @@ def api_history():
     if not ok:
         if API_KEY:
             return jsonify({"ok": False, "error": errmsg}), 401
-    with CHAT_LOCK:
-        hist_copy = list(CHAT_HISTORY)
+    # ?since=<seq or id>&limit=N: turns after the cursor, oldest first; no cursor = newest page.
+    # An unknown cursor also gets the newest page, flagged with X-History-Reset so the client reloads.
+    since = request.args.get("since")
+    try:
+        limit = int(request.args.get("limit") or HISTORY_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"ok": False, "error": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"ok": False, "error": "limit must be positive"}), 400
+    limit = min(limit, HISTORY_MAX_PAGE)
+    cursor = CHAT_HISTORY.resolve(since) if since else None
+    reset = bool(since) and cursor is None
+    page = CHAT_HISTORY.page(cursor, limit)
     def norm(e):
         entry = dict(e)
         if isinstance(entry.get("time"), (int, float)):
             entry["time"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(entry["time"]))
         return entry
-    return jsonify([norm(x) for x in hist_copy]), 200
+    resp = jsonify([norm(x) for x in page])
+    last = page[-1]["seq"] if page else (cursor or 0)
+    resp.headers["X-History-Cursor"] = str(last)
+    resp.headers["X-History-More"] = "1" if cursor is not None and last < CHAT_HISTORY.last_seq else "0"
+    resp.headers["X-History-Reset"] = "1" if reset else "0"
+    return resp, 200
+
+@app.route("/api/stats", methods=["GET"])
+def api_stats():
+    ok, errmsg = _require_api_key(request)
+    if not ok:
+        return jsonify({"ok": False, "error": errmsg}), 401
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    tried = stats.get("local_intent_hits", 0) + stats.get("local_intent_misses", 0)
+    if tried:
+        stats["local_intent_hit_rate"] = round(stats.get("local_intent_hits", 0) / tried, 3)
+        stats["local_intent_avg_us"] = round(stats.pop("local_intent_us", 0) / tried, 1)
+    looked_up = stats.get("intent_cache_hits", 0) + stats.get("intent_cache_misses", 0)
+    if looked_up:
+        stats["intent_cache_hit_rate"] = round(stats.get("intent_cache_hits", 0) / looked_up, 3)
+    stats["intent_cache_size"] = len(_INTENT_CACHE)
+    if stats.get("gmail_fetches"):
+        stats["gmail_fetch_avg_ms"] = round(stats.pop("gmail_fetch_ms", 0) / stats["gmail_fetches"], 1)
+    started = stats.get("prefetch_started", 0)
+    if started:
+        stats["prefetch_use_rate"] = round(stats.get("prefetch_used", 0) / started, 3)
+    with _LLM_CAPS_LOCK:
+        stats["llm_output_modes"] = dict(_LLM_CAPS)
+    return jsonify({"ok": True, "stats": stats}), 200
 
 @app.route("/api/email/draft", methods=["POST"])
 def api_email_draft():
@@ -1263,50 +2359,24 @@ def api_email_draft():
     if not ok_req and API_KEY:
         return jsonify({"ok": False, "error": errmsg}), 401
     data = request.get_json(force=True, silent=True) or {}
-    supplied_to = data.get("to")
-    supplied_subject = data.get("subject")
-    supplied_body = data.get("body")
-    user_prompt = (data.get("prompt") or "").strip()
-    if not (supplied_to and supplied_subject and supplied_body):
-        ok, draft = _draft_email_with_context(user_prompt or "Compose an email.")
-        if not ok:
-            return jsonify({"ok": False, "error": draft}), 500
-        to_list, subject, body = draft["to"], draft["subject"], draft["body"]
-    else:
-        to_list = supplied_to if isinstance(supplied_to, list) else [supplied_to]
-        subject = supplied_subject
-        body = supplied_body
-    CURRENT_DRAFT.clear()
-    CURRENT_DRAFT.update({"to": to_list, "subject": subject, "body": body, "opened_compose": False})
-    msg = _open_gmail_compose(to_list, subject, body)
-    CURRENT_DRAFT["opened_compose"] = True if not msg.startswith("(") else False
-    return jsonify({"ok": True, "draft": CURRENT_DRAFT, "message": msg, "opened_compose": CURRENT_DRAFT["opened_compose"]}), 200
+    payload, status = _email_draft((data.get("prompt") or "").strip(), data.get("to"), data.get("subject"), data.get("body"))
+    return jsonify(payload), status
 
 @app.route("/api/email/send", methods=["POST"])
 def api_email_send():
     ok_req, errmsg = _require_api_key(request)
     if not ok_req and API_KEY:
         return jsonify({"ok": False, "error": errmsg}), 401
-    if not CURRENT_DRAFT:
-        return jsonify({"ok": False, "error": "No draft staged."}), 400
-    try:
-        msg_id = _gmail_send(CURRENT_DRAFT.get("to"), CURRENT_DRAFT.get("subject"), CURRENT_DRAFT.get("body"))
-        sent_info = {"messageId": msg_id}
-        CURRENT_DRAFT.clear()
-        _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text":"Email sent.", "time": time.time()})
-        return jsonify({"ok": True, "sent": sent_info, "message": "Email sent via Gmail API."}), 200
-    except Exception as e:
-        app.logger.exception("Send failed")
-        return jsonify({"ok": False, "error": f"Send failed: {e}"}), 500
+    payload, status = _email_send()
+    return jsonify(payload), status
 
 @app.route("/api/email/discard", methods=["POST"])
 def api_email_discard():
     ok_req, errmsg = _require_api_key(request)
     if not ok_req and API_KEY:
         return jsonify({"ok": False, "error": errmsg}), 401
-    CURRENT_DRAFT.clear()
-    _add_history_entry({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text":"Draft discarded.", "time": time.time()})
-    return jsonify({"ok": True, "message": "Draft discarded."}), 200
+    payload, status = _email_discard()
+    return jsonify(payload), status
 
 @app.route("/api/email/summarize", methods=["POST"])
 def api_email_summarize():
@@ -1388,4 +2458,5 @@ def api_desktop_run():
         return jsonify({"ok": False, "plan": plan_or_err, "logs": logs, "error": err}), 500
 
 if __name__ == "__main__":
+    threading.Thread(target=_gmail_warmup, name="gmail-warmup", daemon=True).start()
     app.run(host="127.0.0.1", port=int(os.environ.get("FLASK_PORT", 5003)), debug=False, threaded=True)
@@ -0,0 +1,457 @@
+"""
+Async serving mode for fastROUT.
+
+  python fastROUT_async.py                          # hypercorn on FLASK_PORT (5003)
+  hypercorn fastROUT_async:asgi_app -b 127.0.0.1:5003
+
+/api/open, /api/open/stream, /api/search and /api/email/summarize run as
+coroutines: the LLM (AsyncOpenAI), Gmail (REST over httpx) and Google search
+(httpx) are awaited, so an in-flight upstream call costs a coroutine rather
+than a thread. Every upstream call has a deadline (asyncio.wait_for) that
+cancels it, and a client that disconnects from /api/open/stream cancels the
+LLM stream and any prefetch still running. Desktop automation, reels and
+drafts stay blocking and run on a worker thread; every other route is the
+Flask app from fastROUT, unchanged.
+
+Needs: pip install quart quart-cors hypercorn asgiref
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+from openai import AsyncOpenAI
+from quart import Quart, Response, request, jsonify
+
+import fastROUT as fr
+
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "30"))
+SUMMARY_TIMEOUT_S = float(os.environ.get("SUMMARY_TIMEOUT_S", "20"))
+GMAIL_TIMEOUT_S = float(os.environ.get("GMAIL_TIMEOUT_S", "15"))
+SEARCH_TIMEOUT_S = float(os.environ.get("SEARCH_TIMEOUT_S", "10"))
+GMAIL_CONCURRENCY = fr.GMAIL_CONCURRENCY
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "200"))
+
+GMAIL_API = f"{fr.GMAIL_API_ENDPOINT or 'https://gmail.googleapis.com'}/gmail/v1/users/me"
+ASYNC_ROUTES = {"/api/open", "/api/open/stream", "/api/search", "/api/email/summarize"}
+
+aapp = Quart(__name__)
+
+try:
+    from quart_cors import cors
+    aapp = cors(aapp, allow_origin="*", allow_headers=["Content-Type", "X-API-Key"])
+except Exception:
+    fr.app.logger.info("quart_cors not installed — async routes answer without CORS headers.")
+
+# created on the serving loop (before_serving)
+_http = None
+_llm = None
+_gmail_lock = None
+
+
+@aapp.before_serving
+async def _start_clients():
+    global _http, _llm, _gmail_lock
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+    _http = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0))
+    if fr.FASTR_API_KEY:
+        _llm = AsyncOpenAI(base_url=fr.FASTR_BASE, api_key=fr.FASTR_API_KEY, max_retries=0)
+    _gmail_lock = asyncio.Lock()
+
+
+@aapp.after_serving
+async def _stop_clients():
+    await _http.aclose()
+    if _llm is not None:
+        await _llm.close()
+
+
+async def _until(aiter, deadline: float):
+    """Items of an async iterator; asyncio.TimeoutError once the loop clock passes deadline."""
+    loop = asyncio.get_running_loop()
+    it = aiter.__aiter__()
+    while True:
+        try:
+            item = await asyncio.wait_for(it.__anext__(), max(0.0, deadline - loop.time()))
+        except StopAsyncIteration:
+            return
+        yield item
+
+
+# ---------------- LLM ----------------
+async def llm_json_stream(messages: list, temperature: float = 0.2, max_tokens: int = 500, model: str = None):
+    """Async fr._llm_json_stream: same learned structured-output mode, one deadline for the whole answer."""
+    model = model or fr.LLM_MODEL
+    modes = fr._llm_modes(model)
+    deadline = asyncio.get_running_loop().time() + LLM_TIMEOUT_S
+    for i, mode in enumerate(modes):
+        fr._stat_inc("llm_calls")
+        kwargs = fr._llm_kwargs(mode, messages, temperature, max_tokens, model, stream=True)
+        try:
+            stream = await asyncio.wait_for(_llm.chat.completions.create(**kwargs),
+                                            max(0.0, deadline - asyncio.get_running_loop().time()))
+        except fr._CAPABILITY_ERRORS as e:
+            if i == len(modes) - 1:
+                raise
+            fr._stat_inc("llm_capability_fallbacks")
+            fr.app.logger.info("LLM %s rejected streamed %s output (%s); trying %s", model, mode, e.__class__.__name__, modes[i + 1])
+            continue
+        except Exception:
+            fr._stat_inc("llm_transport_failures")
+            raise
+        if len(modes) > 1:
+            with fr._LLM_CAPS_LOCK:
+                fr._LLM_CAPS[model] = mode
+        try:
+            async for event in _until(stream, deadline):
+                text = fr._llm_stream_text(event)
+                if text:
+                    yield text
+        except Exception:
+            fr._stat_inc("llm_transport_failures")
+            raise
+        finally:
+            await stream.close()
+        return
+
+
+async def stream_llm_intent(prompt: str, history_entries: list, prefetch: dict = None):
+    """Async fr._stream_llm_intent."""
+    messages = fr._build_messages_for_llm(prompt, history_entries)
+    stream_reply = fr._maybe_force_web_search(prompt, {"intent": "chat"}).get("intent") == "chat"
+    parser = fr._IncrementalJSON()
+    async for chunk in llm_json_stream(messages, temperature=0.7, max_tokens=300):
+        for kind, key, value in parser.feed(chunk):
+            if kind == "text" and key == "reply" and stream_reply and parser.fields.get("intent") == "chat":
+                yield "delta", value
+        if prefetch is not None and fr.EARLY_DISPATCH and not parser.done:
+            _maybe_prefetch(prompt, parser, prefetch)
+    yield "intent", fr._finish_llm_intent(prompt, fr._stream_json_result(parser))
+
+
+async def intent_events(prompt: str, history_entries: list, prefetch: dict):
+    """
+    ("delta", text) for streamed chat reply text, then ("result", (ok, parsed_or_error))
+    the way fr._ask_llm_for_intent answers.
+    """
+    parsed = fr._quick_intent(prompt, history_entries)
+    if parsed is not None:
+        yield "result", (True, parsed)
+        return
+    if _llm is None:
+        yield "result", (False, "LLM disabled: FASTR_API_KEY not set (FastRouter only).")
+        return
+    try:
+        async for kind, value in stream_llm_intent(prompt, history_entries, prefetch):
+            if kind == "delta":
+                yield kind, value
+            else:
+                parsed = value
+    except fr.LLMParseError as e:
+        fr.app.logger.warning("JSON parse failed; raw=%r", e.raw)
+        yield "result", (False, f"LLM responded but JSON parse failed. Raw: {e.raw}")
+        return
+    except asyncio.TimeoutError:
+        fr._stat_inc("llm_timeouts")
+        fr.app.logger.warning("LLM intent call timed out after %ss", LLM_TIMEOUT_S)
+        yield "result", (False, f"LLM call failed: no answer within {LLM_TIMEOUT_S:g}s")
+        return
+    except Exception as e:
+        fr.app.logger.warning("LLM intent call failed: %s", e)
+        yield "result", (False, f"LLM call failed: {e}")
+        return
+    fr._remember_intent(prompt, history_entries, parsed)
+    yield "result", (True, parsed)
+
+
+async def summarize_emails(messages: list, user_request: str = "", timeout_s: float = SUMMARY_TIMEOUT_S):
+    """Async fr._summarize_emails_with_llm: extractive summary if the LLM fails or misses the deadline."""
+    if _llm is None:
+        return False, "LLM disabled: FASTR_API_KEY not set."
+    try:
+        resp = await asyncio.wait_for(_llm.chat.completions.create(
+            model=fr.LLM_MODEL, messages=fr._summarize_messages_for_llm(messages, user_request),
+            temperature=0.2, max_tokens=600), timeout_s)
+        return True, resp.choices[0].message.content.strip()
+    except Exception as e:
+        fr.app.logger.warning("Email summary via LLM failed (%s); using extractive summary", str(e) or e.__class__.__name__)
+        return True, fr._extractive_summary(messages)
+
+
+# ---------------- Gmail / search ----------------
+async def _gmail_headers() -> dict:
+    creds = fr._GMAIL_CREDS
+    if not fr._gmail_creds_fresh(creds):
+        async with _gmail_lock:
+            # token file / refresh / first-run consent are blocking; the sync side shares the result
+            creds = await asyncio.to_thread(fr._gmail_credentials)
+    return {"Authorization": f"Bearer {creds.token}"}
+
+
+async def _gmail_get(path: str, headers: dict, **params) -> dict:
+    r = await asyncio.wait_for(_http.get(f"{GMAIL_API}/{path}", params=params, headers=headers), GMAIL_TIMEOUT_S)
+    r.raise_for_status()
+    return r.json()
+
+
+async def gmail_fetch_messages(query: str, limit: int = 25):
+    """Async fr._gmail_fetch_messages: the gets run concurrently; messages that fail are skipped."""
+    headers = await _gmail_headers()
+    listed = await _gmail_get("messages", headers, q=query, maxResults=min(limit, 30))
+    ids = [m["id"] for m in (listed.get("messages") or [])[:limit]]
+    sem = asyncio.Semaphore(GMAIL_CONCURRENCY)
+
+    async def full(msg_id):
+        async with sem:
+            return fr._gmail_parse_message(await _gmail_get(f"messages/{msg_id}", headers, format="full"))
+
+    results = await asyncio.gather(*(full(i) for i in ids), return_exceptions=True)
+    return [r for r in results if not isinstance(r, BaseException)]
+
+
+async def google_search(query: str, k: int = fr.SEARCH_MAX_RESULTS):
+    """Async fr._google_search."""
+    if not fr.GOOGLE_API_KEY or not fr.GOOGLE_CSE_ID:
+        return False, "Google search is not configured. Set GOOGLE_API_KEY and GOOGLE_CSE_ID."
+    try:
+        r = await asyncio.wait_for(_http.get(fr.GOOGLE_CSE_URL, params=fr._google_search_params(query, k)), SEARCH_TIMEOUT_S)
+        if r.status_code != 200:
+            return False, f"Google CSE error {r.status_code}: {r.text[:200]}"
+        return True, fr._google_search_results(r.json())
+    except asyncio.TimeoutError:
+        return False, f"Search failed: no answer within {SEARCH_TIMEOUT_S:g}s"
+    except Exception as e:
+        fr.app.logger.exception("Google CSE call failed")
+        return False, f"Search failed: {e}"
+
+
+# ---------------- dispatch ----------------
+# intents whose prefetch is a coroutine here; the rest go to fr._PREFETCH_POOL as in sync mode
+_ASYNC_JOBS = {
+    "summarize_emails": gmail_fetch_messages,
+    "web_search": google_search,
+}
+
+
+def _maybe_prefetch(prompt: str, parser, prefetch: dict):
+    resp = fr._prefetch_due(prompt, parser, prefetch)
+    if resp is None:
+        return
+    intent, job = resp["intent"], fr._prefetch_job(prompt, resp)
+    if job and intent in _ASYNC_JOBS:
+        fr._start_prefetch(prefetch, intent, (job[0], _ASYNC_JOBS[intent]),
+                           lambda fn, *args: asyncio.ensure_future(fn(*args)))
+    else:
+        fr._start_prefetch(prefetch, intent, job, fr._PREFETCH_POOL.submit)
+
+
+async def _prefetched(prefetch: dict, intent: str, args: tuple, fn):
+    entry = (prefetch or {}).get(intent)
+    if entry:
+        if entry[0] == args:
+            fr._stat_inc("prefetch_used")
+            return await entry[1]
+        fr._stat_inc("prefetch_discarded")
+    return await fn(*args)
+
+
+def _cancel_prefetch(prefetch: dict):
+    for entry in prefetch.values():
+        if entry and isinstance(entry[1], asyncio.Future) and not entry[1].done():
+            entry[1].cancel()
+
+
+# coroutine handlers for the intents that wait on upstream services, registered
+# like fr.INTENT_HANDLERS; every other intent runs its sync handler on a worker thread
+ASYNC_INTENT_HANDLERS = {}
+
+
+async def dispatch_intent(prompt: str, resp: dict, sync: bool = False, prefetch: dict = None):
+    """Async fr._dispatch_intent."""
+    handler = ASYNC_INTENT_HANDLERS.get(resp.get("intent"))
+    if handler is not None:
+        return await handler(prompt, resp, sync=sync, prefetch=prefetch)
+    # desktop automation, reels and drafts block on the local machine, not on the network
+    return await asyncio.to_thread(fr._dispatch_intent, prompt, resp, sync, prefetch)
+
+
+@fr.intent_handler("web_search", registry=ASYNC_INTENT_HANDLERS)
+async def _handle_web_search(prompt, resp, sync=False, prefetch=None):
+    q, k = fr._search_args(prompt, resp)
+    result = await _prefetched(prefetch, "web_search", (q, k), google_search)
+    return await asyncio.to_thread(fr._search_reply, q, resp.get("reply") or "", result)
+
+
+@fr.intent_handler("summarize_emails", registry=ASYNC_INTENT_HANDLERS)
+async def _handle_summarize_emails(prompt, resp, sync=False, prefetch=None):
+    q, limit = fr._summarize_query(prompt, resp)
+    if not q:
+        return {"ok": False, "message": "Need sender or query to summarize."}, 400
+    try:
+        t0 = time.time()
+        messages = await _prefetched(prefetch, "summarize_emails", (q, limit), gmail_fetch_messages)
+        fetch_ms = int((time.time()-t0)*1000)
+        t1 = time.time()
+        ok_s, summary = await summarize_emails(messages, user_request=f"Summarize {q}")
+        sum_ms = int((time.time()-t1)*1000)
+        fr.app.logger.info(f"Summarize: fetched {len(messages)} in {fetch_ms}ms; summarized in {sum_ms}ms")
+        return await asyncio.to_thread(fr._summary_reply, q, resp.get("reply") or "", messages, ok_s, summary)
+    except Exception as e:
+        fr.app.logger.exception("Summarize via router failed")
+        return {"ok": False, "message": f"Summarize failed: {e}"}, 500
+
+
+# ---------------- routes ----------------
+async def add_history(entry: dict):
+    """fr._add_history_entry off the event loop (it writes to SQLite)."""
+    await asyncio.to_thread(fr._add_history_entry, entry)
+
+
+async def _read_prompt():
+    """(prompt, None) or (None, error response)."""
+    ok_req, errmsg = fr._require_api_key(request)
+    if not ok_req:
+        return None, (jsonify({"ok": False, "error": errmsg}), 401)
+    data = await request.get_json(force=True, silent=True) or {}
+    prompt = (data.get("prompt") or "").strip()
+    if not prompt:
+        return None, (jsonify({"ok": False, "error": "no prompt provided"}), 400)
+    await add_history({"id": f"u-{int(time.time()*1000)}", "sender": "user", "text": prompt, "time": time.time()})
+    return prompt, None
+
+
+@aapp.route("/api/open", methods=["POST", "OPTIONS"])
+async def open_api():
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True}), 200
+    prompt, err = await _read_prompt()
+    if err:
+        return err
+    prefetch = {}
+    try:
+        ok, resp = False, None
+        async for kind, value in intent_events(prompt, fr.CHAT_HISTORY.recent(), prefetch):
+            if kind == "result":
+                ok, resp = value
+        if not ok:
+            await add_history({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": resp, "time": time.time()})
+            return jsonify({"ok": False, "message": resp}), 500
+        payload, status = await dispatch_intent(prompt, resp, sync=request.args.get("sync") == "1", prefetch=prefetch)
+        return jsonify(payload), status
+    finally:
+        _cancel_prefetch(prefetch)
+
+
+@aapp.route("/api/open/stream", methods=["POST", "OPTIONS"])
+async def open_stream_api():
+    """Same events as the Flask route: "delta" while the reply is written, then "done"."""
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True}), 200
+    prompt, err = await _read_prompt()
+    if err:
+        return err
+    sync = request.args.get("sync") == "1"
+
+    async def events():
+        prefetch = {}
+        try:
+            ok, resp = False, None
+            async for kind, value in intent_events(prompt, fr.CHAT_HISTORY.recent(), prefetch):
+                if kind == "delta":
+                    yield fr._sse("delta", {"text": value})
+                else:
+                    ok, resp = value
+            if not ok:
+                await add_history({"id": f"b-{int(time.time()*1000)}", "sender": "bot", "text": resp, "time": time.time()})
+                yield fr._sse("done", {"ok": False, "message": resp, "status": 500})
+                return
+            payload, status = await dispatch_intent(prompt, resp, sync=sync, prefetch=prefetch)
+            yield fr._sse("done", {**payload, "status": status})
+        finally:
+            _cancel_prefetch(prefetch)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@aapp.route("/api/search", methods=["POST", "OPTIONS"])
+async def api_search():
+    if request.method == "OPTIONS":
+        return jsonify({"ok": True}), 200
+    ok_req, errmsg = fr._require_api_key(request)
+    if not ok_req:
+        return jsonify({"ok": False, "error": errmsg}), 401
+    data = await request.get_json(force=True, silent=True) or {}
+    q = (data.get("query") or "").strip()
+    k = int(data.get("k") or fr.SEARCH_MAX_RESULTS)
+    if not q:
+        return jsonify({"ok": False, "error": "Provide 'query'."}), 400
+    ok_s, results_or_err = await google_search(q, k=k)
+    if not ok_s:
+        msg = f"Search failed: {results_or_err}"
+        await add_history({"id": f"b-{int(time.time()*1000)}","sender":"bot","text": msg,"time": time.time()})
+        return jsonify({"ok": False, "error": msg}), 500
+    payload, status = await asyncio.to_thread(fr._search_reply, q, "", (ok_s, results_or_err))
+    payload.pop("message", None)
+    return jsonify(payload), status
+
+
+@aapp.route("/api/email/summarize", methods=["POST"])
+async def api_email_summarize():
+    ok_req, errmsg = fr._require_api_key(request)
+    if not ok_req and fr.API_KEY:
+        return jsonify({"ok": False, "error": errmsg}), 401
+    data = await request.get_json(force=True, silent=True) or {}
+    sender = (data.get("sender") or "").strip()
+    query = (data.get("query") or "").strip()
+    limit = int(data.get("limit") or 15)
+    user_req = (data.get("request") or "").strip()
+    if not query:
+        if not sender:
+            return jsonify({"ok": False, "error": "Provide 'sender' or 'query'."}), 400
+        query = fr._sender_to_query(sender) + " newer_than:30d"
+    try:
+        t0 = time.time()
+        messages = await gmail_fetch_messages(query, limit=limit)
+        fetch_ms = int((time.time()-t0)*1000)
+        t1 = time.time()
+        ok, result = await summarize_emails(messages, user_request=user_req or f"Summarize {query}")
+        sum_ms = int((time.time()-t1)*1000)
+        fr.app.logger.info(f"/api/email/summarize: fetched {len(messages)} in {fetch_ms}ms; summarized in {sum_ms}ms")
+        if not ok:
+            return jsonify({"ok": False, "error": result}), 500
+        await add_history({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text":"Here you go.", "time": time.time()})
+        await add_history({"id": f"b-{int(time.time()*1000)}", "sender":"bot","text": result, "time": time.time()})
+        return jsonify({"ok": True, "query": query, "count": len(messages), "summary": result}), 200
+    except Exception as e:
+        fr.app.logger.exception("Summarize failed")
+        return jsonify({"ok": False, "error": f"Summarize failed: {e}"}), 500
+
+
+_flask_asgi = WsgiToAsgi(fr.app)
+
+
+async def asgi_app(scope, receive, send):
+    """The async routes above; everything else is the Flask app (run on asgiref's worker threads)."""
+    if scope["type"] != "http" or scope["path"] in ASYNC_ROUTES:
+        await aapp(scope, receive, send)
+    else:
+        await _flask_asgi(scope, receive, send)
+
+
+def main():
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    threading.Thread(target=fr._gmail_warmup, name="gmail-warmup", daemon=True).start()
+    config = Config()
+    config.bind = [f"127.0.0.1:{int(os.environ.get('FLASK_PORT', 5003))}"]
+    asyncio.run(serve(asgi_app, config))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
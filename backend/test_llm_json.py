@@ -0,0 +1,80 @@
+"""
+Regression tests for the LLM JSON parsing in fastROUT.
+
+  python -m pytest -q test_llm_json.py
+"""
+import json
+
+import pytest
+
+import fastROUT as fr
+
+
+def _feed_in_pieces(text, size):
+    parser = fr._IncrementalJSON()
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+    return parser
+
+
+VALID = [
+    {"intent": "chat", "reply": "They called it “great”, and left."},
+    {"intent": "chat", "reply": "Try the “Settings”: it is there."},
+    {"intent": "web_search", "search_query": "“best” laptops, 2026", "reply": "On it: ‘searching’."},
+    {"intent": "chat", "reply": "Ｆｕｌｌｗｉｄｔｈ ﬁ ligature ½ stays as written​."},
+    {"intent": "compose_email", "to": ["a@b.c"], "subject": "Re: “Q3”, final", "body": "He said \"ok\", then: “no”.", "reply": "Drafted “Q3”, ok?"},
+]
+
+
+@pytest.mark.parametrize("obj", VALID)
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_valid_json_round_trips(obj, size):
+    raw = json.dumps(obj, ensure_ascii=False)
+    parser = _feed_in_pieces(raw, size)
+    assert parser.done
+    assert parser.value() == obj
+    assert fr._stream_json_result(parser) == obj
+
+
+@pytest.mark.parametrize("obj", VALID)
+def test_streamed_reply_text_matches_value(obj):
+    raw = json.dumps(obj, ensure_ascii=False)
+    parser = fr._IncrementalJSON()
+    pieces = []
+    for ch in raw:
+        pieces.extend(v for kind, key, v in parser.feed(ch) if kind == "text" and key == "reply")
+    assert "".join(pieces) == obj["reply"]
+
+
+def test_curly_quote_before_comma():
+    raw = '{"intent":"chat","reply":"They called it “great”, and left."}'
+    assert fr._coerce_json_from_text(raw) == {"intent": "chat", "reply": "They called it “great”, and left."}
+    assert _feed_in_pieces(raw, 2).value()["reply"] == "They called it “great”, and left."
+
+
+def test_curly_quote_before_colon():
+    raw = '{"intent":"chat","reply":"Try the “Settings”: it is there."}'
+    assert fr._coerce_json_from_text(raw) == {"intent": "chat", "reply": "Try the “Settings”: it is there."}
+    assert set(_feed_in_pieces(raw, 2).value()) == {"intent", "reply"}
+
+
+def test_smart_quoted_json_still_parses():
+    raw = '```json\n{“intent”: “chat”, “reply”: “It’s fine, really”,}\n```'
+    assert fr._coerce_json_from_text(raw) == {"intent": "chat", "reply": "It’s fine, really"}
+
+
+def test_single_quotes_bare_keys_and_literals():
+    raw = "Sure: {intent: 'summarize_emails', 'sender': 'Bob's boss', limit: 5, 'to': ['x'], ok: True,}"
+    assert fr._coerce_json_from_text(raw) == {"intent": "summarize_emails", "sender": "Bob's boss",
+                                              "limit": 5, "to": ["x"], "ok": True}
+
+
+def test_nested_array_with_curly_quotes_is_strict_first():
+    raw = '{"intent":"compose_email","to":["“Al”, <al@x.y>"],"reply":"ok"}'
+    assert fr._coerce_json_from_text(raw)["to"] == ["“Al”, <al@x.y>"]
+    assert _feed_in_pieces(raw, 4).value()["to"] == ["“Al”, <al@x.y>"]
+
+
+def test_no_object_raises():
+    with pytest.raises(ValueError):
+        fr._coerce_json_from_text("no json here")
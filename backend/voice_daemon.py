@@ -1,13 +1,19 @@
 import os
 import io
+import re
+import json
 import time
 import queue
 import wave
-import threading
+import hashlib
+import argparse
+import itertools
 import tempfile
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
-import sounddevice as sd
 from dotenv import load_dotenv
 import pyttsx3
 
@@ -15,22 +21,96 @@ import pyttsx3
 load_dotenv()
 API_BASE = os.getenv("AINEK_API_BASE", "http://127.0.0.1:5003")
 API_KEY = os.getenv("FLASK_API_KEY")
+# 1 = ask /api/open/stream (SSE) and start speaking at the first finished sentence
+BACKEND_STREAM = os.getenv("AINEK_STREAM", "0") == "1"
+BACKEND_TIMEOUT = (5, 60)  # connect, read
 
 SAMPLE_RATE = 16000
 BLOCK_SIZE = 1024
 SILENCE_THRESHOLD = 0.01
 MAX_RECORD_SECONDS = 15
 
+# VAD: "adaptive" (noise-floor tracking), "rms" (fixed SILENCE_THRESHOLD) or "webrtc"
+VAD_ENGINE = os.getenv("VAD_ENGINE", "adaptive").strip().lower()
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "9"))
+VAD_ONSET_MS = int(os.getenv("VAD_ONSET_MS", "120"))
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "1500"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "300"))
+
+# Mic capture ring: fixed memory no matter how far the daemon falls behind
+RING_SECONDS = float(os.getenv("AUDIO_RING_SECONDS", "30"))
+RING_OVERFLOW = os.getenv("AUDIO_RING_OVERFLOW", "drop_oldest").strip().lower()  # or drop_newest
+
+# Latency metrics: rolling percentiles per span, dumped as JSON lines (set but blank = no file)
+METRICS_PATH = os.getenv("AINEK_METRICS_PATH")
+if METRICS_PATH is None:
+    METRICS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice_metrics.jsonl")
+METRICS_PATH = METRICS_PATH.strip()
+METRICS_DUMP_SECONDS = float(os.getenv("AINEK_METRICS_DUMP_SECONDS", "60"))
+METRICS_WINDOW = int(os.getenv("AINEK_METRICS_WINDOW", "500"))
+
+# 0 = don't speak replies (offline replay); they are still fetched and traced
+TTS_ENABLED = os.getenv("AINEK_TTS", "1") == "1"
+
+# Bounded hand-off queues between pipeline stages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+# Barge-in: talking over the assistant stops playback and starts a new command
+BARGE_IN = os.getenv("BARGE_IN", "0") == "1"
+BARGE_IN_ONSET_MS = int(os.getenv("BARGE_IN_ONSET_MS", "250"))
+BARGE_IN_MARGIN = float(os.getenv("BARGE_IN_MARGIN", "3.0"))     # mic must beat expected echo by this factor
+BARGE_IN_MIN_RMS = float(os.getenv("BARGE_IN_MIN_RMS", "0.02"))
+
 WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "base")
 WHISPER_DEVICE_ENV = os.getenv("WHISPER_DEVICE", "").strip().lower()
 
-audio_q = queue.Queue()
-tts_q = queue.Queue()
+# STT backend: whisper (openai-whisper) | faster-whisper (CTranslate2) | vosk
+STT_ENGINE = os.getenv("STT_ENGINE", "whisper").strip().lower()
+FASTER_WHISPER_COMPUTE = os.getenv("FASTER_WHISPER_COMPUTE", "int8")
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "").strip()
+
+# Silence trimming before STT: keep STT_TRIM_PAD_MS around speech, so pauses longer than
+# twice that shrink to it (0 = send the phrase as captured)
+STT_TRIM_PAD_MS = int(os.getenv("STT_TRIM_PAD_MS", "200"))
+
+# Wake word gate: only phrases that start with it reach full STT (empty = off).
+# Comma-separated alternatives, each must be in the Vosk model's vocabulary.
+WAKE_WORD = [w.strip().lower() for w in os.getenv("WAKE_WORD", "").split(",") if w.strip()]
+WAKE_SENSITIVITY = float(os.getenv("WAKE_SENSITIVITY", "0.5"))        # 0..1, higher = more triggers
+WAKE_WINDOW_SECONDS = float(os.getenv("WAKE_WINDOW_SECONDS", "2.0"))  # how far into a phrase to look
+WAKE_FOLLOWUP_SECONDS = float(os.getenv("WAKE_FOLLOWUP_SECONDS", "8"))  # no wake word needed right after a reply
+WAKE_MODEL_PATH = os.getenv("WAKE_MODEL_PATH", "").strip() or VOSK_MODEL_PATH
+
+# Streaming STT: decode while the user is still talking (see StreamingTranscriber)
+STT_STREAMING = os.getenv("STT_STREAMING", "0") == "1"
+STREAM_STEP_SECONDS = float(os.getenv("STT_STREAM_STEP", "1.0"))
+STREAM_PAUSE_SECONDS = float(os.getenv("STT_STREAM_PAUSE", "0.3"))
+# end a streamed phrase this long after speech stops, once the pause decode has covered it (VAD_HANGOVER_MS is the cap)
+STREAM_HANGOVER_MS = int(os.getenv("STT_STREAM_HANGOVER_MS", "500"))
+
+# Rendered-speech cache (memory LRU + on-disk tier) and phrases to have ready at startup
+TTS_CACHE_MB = float(os.getenv("TTS_CACHE_MB", "32"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "256"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tts_cache")
+TTS_PREWARM = [p.strip() for p in os.getenv(
+    "TTS_PREWARM", "Okay.|Done.|Draft discarded.|Email sent.|Stopping reels.|Here you go."
+).split("|") if p.strip()]
+
+phrase_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)  # segmentation -> STT
+text_q = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)    # STT -> backend
+tts_q = queue.Queue(maxsize=64)                      # backend -> TTS synthesis (sentences)
+play_q = queue.Queue(maxsize=2)                      # TTS synthesis -> speaker (rendered audio)
+PIPELINE_STATS = {"phrases_dropped": 0, "trim_in_s": 0.0, "trim_saved_s": 0.0}
 
 SPEECH_ACTIVE = threading.Event()  # TTS speaking -> ignore mic
 MIC_MUTED = threading.Event()      # Hotkey toggled mute
 MUTEX = threading.Lock()           # tiny guard for prints/state
 
+try:
+    import sounddevice as sd
+except Exception:  # no PortAudio: offline replay (bench_replay.py) still works
+    sd = None
+
 try:
     import win32com.client as wincl
     HAS_SAPI = True
@@ -38,130 +118,1566 @@ except Exception:
     HAS_SAPI = False
 
 
+class AudioRing:
+    """
+    Preallocated float32 ring that the PortAudio callback writes into directly.
+
+    Positions are absolute sample counts, so a phrase is just (start, end) and
+    is copied out once when it is complete. hold(pos) keeps audio from pos
+    onwards from being overwritten until release(), even after it was read.
+
+    When the writer would overrun unread (or held) audio the overflow policy
+    decides what is lost: "drop_oldest" overwrites the oldest samples and moves
+    the reader forward, "drop_newest" discards the incoming samples. Lost
+    samples are counted in `dropped`.
+    """
+
+    def __init__(self, seconds=RING_SECONDS, policy=RING_OVERFLOW):
+        blocks = max(4, int(np.ceil(seconds * SAMPLE_RATE / BLOCK_SIZE)))
+        self.capacity = blocks * BLOCK_SIZE
+        self.policy = policy if policy in ("drop_oldest", "drop_newest") else "drop_oldest"
+        self._buf = np.zeros(self.capacity, dtype=np.float32)
+        self.write_pos = 0
+        self.read_pos = 0
+        self.dropped = 0
+        self.status_errors = 0
+        self._hold = None
+        self._cond = threading.Condition()
+
+    def write(self, data: np.ndarray):
+        n = len(data)
+        with self._cond:
+            tail = self.read_pos if self._hold is None else min(self.read_pos, self._hold)
+            over = n - (self.capacity - (self.write_pos - tail))
+            if over > 0:
+                self.dropped += over
+                if self.policy == "drop_newest":
+                    n -= over
+                    if n <= 0:
+                        return
+                else:
+                    tail += over
+                    self.read_pos = max(self.read_pos, tail)
+                    if self._hold is not None:
+                        self._hold = max(self._hold, tail)
+            i = self.write_pos % self.capacity
+            k = min(n, self.capacity - i)
+            self._buf[i:i + k] = data[:k]
+            if k < n:
+                self._buf[:n - k] = data[k:n]
+            self.write_pos += n
+            self._cond.notify()
+
+    def read(self, n: int = BLOCK_SIZE, timeout: float = None):
+        """
+        Next n unread samples, or None on timeout. Returns a view into the
+        ring when it doesn't wrap, so consume it before reading much further.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.write_pos - self.read_pos < n:
+                wait = 0.5 if deadline is None else min(0.5, deadline - time.monotonic())
+                if wait <= 0:
+                    return None
+                self._cond.wait(wait)  # short waits keep Ctrl+C responsive
+            start = self.read_pos
+            self.read_pos += n
+        i = start % self.capacity
+        if i + n <= self.capacity:
+            return self._buf[i:i + n]
+        return self.extract(start, start + n)
+
+    def extract(self, start: int, end: int) -> np.ndarray:
+        """Single copy of [start, end); the part already overwritten is skipped."""
+        with self._cond:
+            start = max(start, self.write_pos - self.capacity)
+            end = min(end, self.write_pos)
+            out = np.empty(max(0, end - start), dtype=np.float32)
+            i = start % self.capacity
+            k = min(len(out), self.capacity - i)
+            out[:k] = self._buf[i:i + k]
+            out[k:] = self._buf[:len(out) - k]
+        return out
+
+    def hold(self, pos: int):
+        with self._cond:
+            self._hold = max(pos, self.write_pos - self.capacity)
+            return self._hold
+
+    def release(self):
+        with self._cond:
+            self._hold = None
+
+    def skip_to_end(self):
+        with self._cond:
+            self.read_pos = self.write_pos
+            self._hold = None
+
+    def unread(self) -> int:
+        with self._cond:
+            return self.write_pos - self.read_pos
+
+
+AUDIO_RING = AudioRing()
+
+
 def _audio_cb(indata, frames, time_info, status):
-    audio_q.put(indata.copy())
+    if status:
+        AUDIO_RING.status_errors += 1
+    AUDIO_RING.write(indata[:, 0])
+
+
+class ReplaySource:
+    """
+    Stands in for the sd.InputStream in listen_loop: feeds WAV files into the
+    ring block by block, at real-time pace or as fast as the reader keeps up.
+    Each file is followed by gap_s of room tone (noise at the file's own
+    floor, since digital silence would throw the adaptive VAD) so its last
+    phrase can end.
+    """
+
+    def __init__(self, paths, realtime=True, gap_s=None, ring=None):
+        self.paths = list(paths)
+        self.realtime = realtime
+        self.gap_s = (VAD_HANGOVER_MS / 1000.0 + 0.5) if gap_s is None else gap_s
+        self.ring = ring or AUDIO_RING
+        self.offsets = []  # (path, first ring position, duration_s)
+        self.audio_s = 0.0
+        self.finished = False
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.finished = True
+
+    def _room_tone(self, audio: np.ndarray) -> np.ndarray:
+        n = int(self.gap_s * SAMPLE_RATE)
+        n += -(len(audio) + n) % BLOCK_SIZE  # keep every file block-aligned, no zero padding
+        frame = SAMPLE_RATE // 50
+        frames = audio[:len(audio) // frame * frame].reshape(-1, frame)
+        floor = float(np.percentile(np.sqrt(np.mean(frames ** 2, axis=1)), 10)) if len(frames) else 0.0
+        return (np.random.default_rng(0).standard_normal(n) * floor).astype(np.float32)
+
+    def _run(self):
+        t_next = time.monotonic()
+        for path in self.paths:
+            with open(path, "rb") as f:
+                audio = _wav_bytes_to_float32(f.read())
+            gap = self._room_tone(audio)
+            self.offsets.append((path, self.ring.write_pos, len(audio) / SAMPLE_RATE))
+            self.audio_s += len(audio) / SAMPLE_RATE
+            data = np.concatenate([audio, gap])
+            for i in range(0, len(data), BLOCK_SIZE):
+                if self.finished:
+                    return
+                if self.realtime:
+                    t_next += BLOCK_SIZE / SAMPLE_RATE
+                    time.sleep(max(0.0, t_next - time.monotonic()))
+                else:
+                    # stay just ahead of the reader, and let STT catch up instead of dropping phrases
+                    while ((self.ring.unread() >= 4 * BLOCK_SIZE or phrase_q.full())
+                           and not self.finished):
+                        time.sleep(0.0005)
+                self.ring.write(data[i:i + BLOCK_SIZE])
+        self.finished = True
+
+    def locate(self, pos: int):
+        """(file, seconds into it) for a ring position."""
+        for path, start, dur in reversed(self.offsets):
+            if pos >= start:
+                return path, (pos - start) / SAMPLE_RATE
+        return None, 0.0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.finished and self.ring.unread() < BLOCK_SIZE
 
 
 def _rms(x):
     return float(np.sqrt(np.mean(np.square(x.astype(np.float32)))))
 
 
-# ---- STT (OpenAI Whisper local) ----
-_whisper_ready = False
-_whisper_model = None
-_whisper_device = "cpu"
+# ---- Voice activity detection ----
+class RmsVAD:
+    """
+    Frame-level speech decisions plus the onset/hangover state machine.
+
+    This base engine is the original behaviour: one frame per block, speech
+    whenever the block RMS is above SILENCE_THRESHOLD.
+    """
+    name = "rms"
+    frame_len = BLOCK_SIZE
+
+    def __init__(self, onset_ms=0, hangover_ms=VAD_HANGOVER_MS):
+        frame_ms = 1000.0 * self.frame_len / SAMPLE_RATE
+        self.onset_frames = max(1, int(round(onset_ms / frame_ms)))
+        self.hangover_frames = max(1, int(round(hangover_ms / frame_ms)))
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self.voiced = False  # last block had at least one speech frame
+        self._run = 0
+        self._quiet = 0
+
+    def _frames(self, block: np.ndarray) -> np.ndarray:
+        n = len(block) // self.frame_len
+        return block[:n * self.frame_len].reshape(n, self.frame_len)
+
+    def _decide(self, frames: np.ndarray) -> np.ndarray:
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        return rms > SILENCE_THRESHOLD
+
+    def process(self, block: np.ndarray) -> bool:
+        """Feed one block; returns whether we are inside a speech region."""
+        raw = self._decide(self._frames(np.asarray(block, dtype=np.float32).reshape(-1)))
+        self.voiced = bool(raw.any())
+        for v in raw:
+            if v:
+                self._run += 1
+                self._quiet = 0
+                if self._run >= self.onset_frames:
+                    self.in_speech = True
+            else:
+                self._run = 0
+                if self.in_speech:
+                    self._quiet += 1
+                    if self._quiet >= self.hangover_frames:
+                        self.in_speech = False
+                        self._quiet = 0
+        return self.in_speech
+
+    def force_speech(self):
+        """Enter the speech state now (speech was confirmed elsewhere, e.g. barge-in)."""
+        self.in_speech = True
+        self._run = self.onset_frames
+        self._quiet = 0
+
+
+class AdaptiveVAD(RmsVAD):
+    """
+    Energy VAD over 20 ms frames against a tracked noise floor.
+
+    The floor follows the quietest frame of each block: it drops quickly and
+    rises slowly (~8 s), so a fan or air-con settles into the floor instead of
+    holding the phrase open until MAX_RECORD_SECONDS. High zero-crossing frames
+    (hiss) need an extra 6 dB to count as speech.
+    """
+    name = "adaptive"
+    frame_len = SAMPLE_RATE // 50
+    min_db = -60.0
+    floor_down = 0.3
+    floor_up = 0.008
+
+    def __init__(self, margin_db=VAD_MARGIN_DB, onset_ms=VAD_ONSET_MS, hangover_ms=VAD_HANGOVER_MS):
+        self.margin_db = margin_db
+        self.floor_db = None  # learned once, kept across phrases
+        super().__init__(onset_ms=onset_ms, hangover_ms=hangover_ms)
+
+    def _decide(self, frames: np.ndarray) -> np.ndarray:
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+        energy_db = 10.0 * np.log10(np.mean(np.square(frames, dtype=np.float32), axis=1) + 1e-10)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        quietest = float(energy_db.min())
+        if self.floor_db is None:
+            self.floor_db = quietest
+        rate = self.floor_down if quietest < self.floor_db else self.floor_up
+        self.floor_db += rate * (quietest - self.floor_db)
+        threshold = self.floor_db + self.margin_db + np.where(zcr > 0.35, 6.0, 0.0)
+        return (energy_db > threshold) & (energy_db > self.min_db)
+
+
+VAD_ENGINES = {"rms": RmsVAD, "adaptive": AdaptiveVAD}
+
+try:
+    import webrtcvad
+
+    class WebRtcVAD(RmsVAD):
+        """Google's WebRTC VAD (pip install webrtcvad) on 20 ms int16 frames."""
+        name = "webrtc"
+        frame_len = SAMPLE_RATE // 50
+
+        def __init__(self, aggressiveness=int(os.getenv("VAD_WEBRTC_MODE", "2")),
+                     onset_ms=VAD_ONSET_MS, hangover_ms=VAD_HANGOVER_MS):
+            self._vad = webrtcvad.Vad(aggressiveness)
+            super().__init__(onset_ms=onset_ms, hangover_ms=hangover_ms)
+
+        def _decide(self, frames: np.ndarray) -> np.ndarray:
+            pcm = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+            return np.array([self._vad.is_speech(f.tobytes(), SAMPLE_RATE) for f in pcm], dtype=bool)
+
+    VAD_ENGINES["webrtc"] = WebRtcVAD
+except Exception:
+    pass
+
+
+def make_vad(name: str = None):
+    name = (name or VAD_ENGINE).lower()
+    if name not in VAD_ENGINES:
+        print(f"[VAD] unknown engine {name!r}, using adaptive")
+        name = "adaptive"
+    return VAD_ENGINES[name]()
+
+
+class Segmenter:
+    """
+    Turns a stream of blocks into phrases using a VAD.
+
+    push() returns "start" when speech is confirmed, "end" when the phrase is
+    complete (hangover elapsed or MAX_RECORD_SECONDS reached), else None.
+    Only VAD_PREROLL_MS of audio is kept from before the onset.
+    """
+
+    def __init__(self, vad=None):
+        self.vad = vad or make_vad()
+        self.max_samples = int(SAMPLE_RATE * MAX_RECORD_SECONDS)
+        self.preroll_blocks = max(1, int(VAD_PREROLL_MS * SAMPLE_RATE / 1000 / BLOCK_SIZE))
+        self.reset()
+
+    def reset(self):
+        self.vad.reset()
+        self.speaking = False
+        self.voiced = False
+        self.samples = 0  # samples since the onset
+
+    def force_start(self):
+        self.vad.force_speech()
+        self.speaking = True
+        self.voiced = True
+        self.samples = 0
+
+    def push(self, block: np.ndarray):
+        in_speech = self.vad.process(block)
+        self.voiced = self.vad.voiced
+        if not self.speaking:
+            if not in_speech:
+                return None
+            self.speaking = True
+            self.samples = len(block)
+            return "start"
+        self.samples += len(block)
+        if not in_speech or self.samples >= self.max_samples:
+            return self.end_now()
+        return None
+
+    def end_now(self):
+        """End the current phrase before the hangover runs out (the caller knows it is complete)."""
+        self.speaking = False
+        self.vad.reset()
+        return "end"
+
+
+# ---- Latency metrics ----
+class LatencyStats:
+    """Rolling window of span durations (ms) with p50/p95/p99, plus JSON-lines output."""
 
+    def __init__(self, window=METRICS_WINDOW, path=METRICS_PATH):
+        self.path = path
+        self._spans = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
 
-def _whisper_init():
-    global _whisper_ready, _whisper_model, _whisper_device
-    if _whisper_ready:
+    def observe(self, span: str, ms: float):
+        with self._lock:
+            self._spans[span].append(ms)
+
+    def summary(self) -> dict:
+        with self._lock:
+            snap = {k: np.array(v) for k, v in self._spans.items() if v}
+        out = {}
+        for span, xs in snap.items():
+            p50, p95, p99 = np.percentile(xs, [50, 95, 99])
+            out[span] = {"n": int(len(xs)), "p50": round(float(p50), 1),
+                         "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+        return out
+
+    def write(self, record: dict):
+        if not self.path:
+            return
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            print(f"[Metrics] write failed: {e}")
+
+    def dump(self):
+        summary = self.summary()
+        if summary:
+            self.write({"type": "summary", "ts": time.time(), "spans": summary, "counters": _counters()})
+        return summary
+
+
+METRICS = LatencyStats()
+
+
+class PhraseTrace:
+    """
+    Spans for one phrase, measured from the end of speech (t0):
+    eos (end-of-speech detection), extract, stt, backend (until the first
+    speakable text), tts_wait, synth and first_audio (t0 -> first sample out).
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, t0: float = None):
+        self.id = next(self._ids)
+        self.t0 = time.monotonic() if t0 is None else t0
+        stt = get_stt()
+        self.model = f"{stt.name}:{stt.model_name}"
+        self.spans = {}
+        self.audio = None     # (start, end, last voiced) ring positions of the phrase
+        self.queued = False  # first reply sentence handed to TTS
+        self.done = False
+
+    def add(self, span: str, ms: float):
+        if span not in self.spans:
+            self.spans[span] = round(ms, 1)
+            METRICS.observe(span, ms)
+
+    def timer(self, span: str):
+        start = time.monotonic()
+        return lambda: self.add(span, (time.monotonic() - start) * 1000.0)
+
+    def finish(self, no_audio: str = None):
+        """Write the phrase record; no_audio says why nothing was played (first_audio is then absent)."""
+        if self.done:
+            return
+        self.done = True
+        record = {"type": "phrase", "ts": time.time(), "id": self.id, "model": self.model, "spans": self.spans}
+        if self.audio:
+            record["audio"] = list(self.audio)
+        if no_audio:
+            self.spans.pop("first_audio", None)
+            record["no_audio"] = no_audio
+        METRICS.write(record)
+        print(f"[Latency] #{self.id} {self.model} " + " ".join(f"{k}={v:.0f}ms" for k, v in self.spans.items())
+              + (f" (no audio: {no_audio})" if no_audio else ""))
+
+
+def _counters() -> dict:
+    return {
+        "ring_dropped_samples": AUDIO_RING.dropped,
+        "phrases_dropped": PIPELINE_STATS["phrases_dropped"],
+        "trim_saved_s": round(PIPELINE_STATS["trim_saved_s"], 1),
+        **{f"tts_cache_{k}": v for k, v in TTS_CACHE.stats.items()},
+        **({f"wake_{k}": round(v, 3) for k, v in WAKE_GATE.stats.items()} if WAKE_GATE.words else {}),
+    }
+
+
+def metrics_worker():
+    while True:
+        time.sleep(METRICS_DUMP_SECONDS)
+        METRICS.dump()
+
+
+def print_metrics_summary(path: str = METRICS_PATH):
+    """The summary command: latest dumped percentiles plus per-phrase totals from the file."""
+    last, phrases = None, []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("type") == "summary":
+                    last = rec
+                elif rec.get("type") == "phrase":
+                    phrases.append(rec)
+    except FileNotFoundError:
+        print(f"No metrics at {path}")
         return
-    import torch
-    import whisper
+    if last:
+        print(f"Rolling window as of {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last['ts']))}:")
+        print(f"  {'span':<12}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for span, v in last["spans"].items():
+            print(f"  {span:<12}{v['n']:>6}{v['p50']:>9.0f}{v['p95']:>9.0f}{v['p99']:>9.0f}")
+        print("  " + ", ".join(f"{k}={v}" for k, v in last.get("counters", {}).items()))
+    by_model = defaultdict(list)
+    for rec in phrases:
+        if "first_audio" in rec.get("spans", {}):
+            by_model[rec.get("model")].append(rec["spans"]["first_audio"])
+    for model, xs in by_model.items():
+        p50, p95 = np.percentile(xs, [50, 95])
+        print(f"{model}: {len(xs)} phrases, end of speech -> first audio p50={p50:.0f}ms p95={p95:.0f}ms")
+
+
+# ---- STT engines ----
+def _wav_bytes_to_float32(audio_bytes: bytes) -> np.ndarray:
+    """Decode 16-bit PCM WAV bytes in memory (legacy callers); no ffmpeg."""
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError("expected 16-bit PCM WAV")
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+        channels = wf.getnchannels()
+        rate = wf.getframerate()
+    audio = pcm.astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        n_out = int(round(len(audio) * SAMPLE_RATE / rate))
+        audio = np.interp(
+            np.linspace(0, len(audio) - 1, n_out), np.arange(len(audio)), audio
+        ).astype(np.float32)
+    return audio
+
+
+def _as_model_input(audio) -> np.ndarray:
+    # Engines take 16 kHz mono float32 directly; this is a no-op for the
+    # buffers listen_loop produces (no copy unless dtype/layout differ).
+    if isinstance(audio, (bytes, bytearray)):
+        return _wav_bytes_to_float32(bytes(audio))
+    return np.ascontiguousarray(np.asarray(audio, dtype=np.float32).reshape(-1))
+
+
+class WhisperEngine:
+    """
+    Reference openai-whisper (torch).
+
+    All engines share this interface: load() is idempotent and thread-safe,
+    decode() returns [(start_s, end_s, text)] segments relative to the audio
+    start, transcribe() returns the joined text. One inference runs at a time.
+    """
+    name = "whisper"
+
+    def __init__(self, model_name=WHISPER_MODEL_NAME):
+        self.model_name = model_name
+        self.device = "cpu"
+        self.model = None
+        self.ready = False
+        self._init_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.ready:
+            return
+        with self._init_lock:
+            if not self.ready:
+                self._load()
+                self.ready = True
+
+    def _load(self):
+        import torch
+        import whisper
+
+        if WHISPER_DEVICE_ENV in ("cpu", "cuda"):
+            self.device = WHISPER_DEVICE_ENV
+        else:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = whisper.load_model(self.model_name, device=self.device)
+
+    def decode(self, audio, initial_prompt=None) -> list:
+        self.load()
+        with self._lock:
+            result = self.model.transcribe(
+                _as_model_input(audio),
+                fp16=False if self.device == "cpu" else True,
+                language=None,  # autodetect
+                condition_on_previous_text=False,
+                initial_prompt=initial_prompt,
+                temperature=0.0,
+            )
+        return [
+            (float(s.get("start", 0.0)), float(s.get("end", 0.0)), (s.get("text") or "").strip())
+            for s in (result.get("segments") or [])
+        ]
+
+    def transcribe(self, audio) -> str:
+        return " ".join(t for _, _, t in self.decode(audio) if t).strip()
 
-    if WHISPER_DEVICE_ENV in ("cpu", "cuda"):
-        _whisper_device = WHISPER_DEVICE_ENV
-    else:
-        _whisper_device = "cuda" if torch.cuda.is_available() else "cpu"
 
-    _whisper_model = whisper.load_model(WHISPER_MODEL_NAME, device=_whisper_device)
-    _whisper_ready = True
+class FasterWhisperEngine(WhisperEngine):
+    """Whisper on CTranslate2 (pip install faster-whisper); int8 on CPU by default."""
+    name = "faster-whisper"
 
+    def _load(self):
+        from faster_whisper import WhisperModel
 
-def transcribe(audio_bytes: bytes) -> str:
-    _whisper_init()
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        tmp.write(audio_bytes)
-        tmp_path = tmp.name
+        self.device = WHISPER_DEVICE_ENV if WHISPER_DEVICE_ENV in ("cpu", "cuda") else "cpu"
+        self.model = WhisperModel(self.model_name, device=self.device, compute_type=FASTER_WHISPER_COMPUTE)
 
+    def decode(self, audio, initial_prompt=None) -> list:
+        self.load()
+        with self._lock:
+            segments, _ = self.model.transcribe(
+                _as_model_input(audio),
+                beam_size=1,
+                language=None,
+                condition_on_previous_text=False,
+                initial_prompt=initial_prompt,
+                temperature=0.0,
+            )
+            return [(float(s.start), float(s.end), (s.text or "").strip()) for s in segments]
+
+
+class VoskEngine(WhisperEngine):
+    """Kaldi/Vosk (pip install vosk) with the model at VOSK_MODEL_PATH; no prompt support."""
+    name = "vosk"
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        super().__init__(model_name=os.path.basename(model_path.rstrip("/\\")) or "vosk")
+        self.model_path = model_path
+
+    def _load(self):
+        from vosk import Model, SetLogLevel
+
+        if not self.model_path or not os.path.isdir(self.model_path):
+            raise RuntimeError(f"VOSK_MODEL_PATH is not a model directory: {self.model_path!r}")
+        SetLogLevel(-1)
+        self.model = Model(self.model_path)
+
+    def decode(self, audio, initial_prompt=None) -> list:
+        from vosk import KaldiRecognizer
+
+        self.load()
+        pcm = (np.clip(_as_model_input(audio), -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        rec = KaldiRecognizer(self.model, SAMPLE_RATE)
+        rec.SetWords(True)
+        rec.AcceptWaveform(pcm)
+        words = json.loads(rec.FinalResult()).get("result") or []
+        return [(float(w["start"]), float(w["end"]), w["word"]) for w in words]
+
+
+STT_ENGINES = {"whisper": WhisperEngine, "faster-whisper": FasterWhisperEngine, "vosk": VoskEngine}
+STT_READY = threading.Event()  # set once the engine is loaded and warmed up
+_stt = None
+_stt_lock = threading.Lock()
+
+
+def make_stt(name: str = None):
+    name = (name or STT_ENGINE).lower()
+    if name not in STT_ENGINES:
+        raise ValueError(f"unknown STT_ENGINE {name!r}; choose from {', '.join(STT_ENGINES)}")
+    return STT_ENGINES[name]()
+
+
+def get_stt():
+    global _stt
+    if _stt is None:
+        with _stt_lock:
+            if _stt is None:
+                _stt = make_stt()
+    return _stt
+
+
+def _stt_preload():
+    if WAKE_GATE.words:
+        WAKE_GATE.load()
+    t0 = time.time()
+    stt = get_stt()
     try:
-        # Whisper will resample internally; file path is simplest/most robust
-        result = _whisper_model.transcribe(
-            tmp_path,
-            fp16=False if _whisper_device == "cpu" else True,
-            language=None,  # autodetect
-            condition_on_previous_text=False,
-            initial_prompt=None,
-            temperature=0.0,
-        )
-        text = (result.get("text") or "").strip()
-        return text
-    finally:
+        stt.load()
+        # one dummy decode so the first real phrase doesn't pay for kernel/graph setup
+        stt.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32))
+    except Exception as e:
+        print(f"[STT] preload failed, will retry on first phrase: {e}")
+        return
+    STT_READY.set()
+    print(f"[STT] {stt.name} '{stt.model_name}' ready on {stt.device} ({time.time() - t0:.1f}s)")
+
+
+def start_stt_preload():
+    """Load and warm the model in the background while the mic is already open."""
+    t = threading.Thread(target=_stt_preload, name="stt-preload", daemon=True)
+    t.start()
+    return t
+
+
+def trim_silence(audio: np.ndarray, pad_ms: int = STT_TRIM_PAD_MS, margin_db: float = VAD_MARGIN_DB) -> np.ndarray:
+    """
+    Cut leading/trailing silence and compress long pauses, in one vectorized pass.
+
+    20 ms frames more than margin_db above the phrase's own noise floor (its
+    10th-percentile frame energy) count as speech; everything within pad_ms of
+    speech is kept, the rest dropped. Returns the input unchanged if nothing
+    looks like speech or there is nothing to cut.
+    """
+    frame = SAMPLE_RATE // 50
+    n = len(audio) // frame
+    if pad_ms <= 0 or n < 3:
+        return audio
+    frames = audio[:n * frame].reshape(n, frame)
+    energy_db = 10.0 * np.log10(np.mean(np.square(frames, dtype=np.float32), axis=1) + 1e-10)
+    floor_db = float(np.percentile(energy_db, 10))
+    voiced = energy_db > max(floor_db + margin_db, float(energy_db.max()) - 40.0)
+    if not voiced.any():
+        return audio
+    r = max(1, int(round(pad_ms / 20)))
+    keep = np.convolve(voiced, np.ones(2 * r + 1, dtype=bool), mode="same") > 0
+    if keep.all():
+        return audio
+    mask = np.zeros(len(audio), dtype=bool)
+    mask[:n * frame] = np.repeat(keep, frame)
+    mask[n * frame:] = keep[-1]
+    return audio[mask]
+
+
+def transcribe(audio) -> str:
+    """
+    Transcribe a 16 kHz mono float32 phrase (as captured by listen_loop).
+    The array goes straight to the model: no temp file, no ffmpeg subprocess.
+    """
+    return get_stt().transcribe(audio)
+
+
+# ---- Wake word gate ----
+class WakeGate:
+    """
+    Keyword spotter in front of transcribe(): a Vosk recognizer restricted to
+    the wake word(s) plus [unk] looks at the first WAKE_WINDOW_SECONDS of a
+    phrase. Only phrases where a wake word comes out with confidence of at
+    least 1 - WAKE_SENSITIVITY go on to full STT and the backend. For
+    WAKE_FOLLOWUP_SECONDS after a wake-word phrase or a reply, phrases pass
+    without it so a conversation can continue.
+
+    CPU time spent spotting is accumulated in `stats` so its cost per hour of
+    audio can be compared against what it saves.
+    """
+
+    def __init__(self, words=WAKE_WORD, sensitivity=WAKE_SENSITIVITY, model_path=WAKE_MODEL_PATH):
+        self.words = list(words)
+        self.min_conf = 1.0 - min(1.0, max(0.0, sensitivity))
+        self.model_path = model_path
+        self.model = None
+        self.open_until = 0.0
+        self.stats = {"passed": 0, "rejected": 0, "followups": 0, "checked_s": 0.0, "cpu_s": 0.0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.words) and self.model is not False
+
+    def load(self):
+        with self._lock:
+            if self.model is not None:
+                return
+            try:
+                from vosk import Model, SetLogLevel
+
+                if not self.model_path or not os.path.isdir(self.model_path):
+                    raise RuntimeError(f"not a Vosk model directory: {self.model_path!r}")
+                SetLogLevel(-1)
+                self.model = Model(self.model_path)
+                print(f"[Wake] listening for {' / '.join(self.words)!r} (min confidence {self.min_conf:.2f})")
+            except Exception as e:
+                print(f"[Wake] gate disabled, every phrase goes to STT: {e}")
+                self.model = False
+
+    def keep_open(self):
+        """Let phrases through without the wake word for the follow-up window."""
+        self.open_until = time.monotonic() + WAKE_FOLLOWUP_SECONDS
+
+    def spot(self, audio: np.ndarray) -> float:
+        """Best wake-word confidence in the first WAKE_WINDOW_SECONDS of audio (0 if absent)."""
+        from vosk import KaldiRecognizer
+
+        window = audio[:int(WAKE_WINDOW_SECONDS * SAMPLE_RATE)]
+        pcm = (np.clip(window, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        rec = KaldiRecognizer(self.model, SAMPLE_RATE, json.dumps(self.words + ["[unk]"]))
+        rec.SetWords(True)
+        rec.AcceptWaveform(pcm)
+        words = json.loads(rec.FinalResult()).get("result") or []
+        best = 0.0
+        for want in self.words:
+            n = len(want.split())
+            for i in range(len(words) - n + 1):
+                run = words[i:i + n]
+                if " ".join(w["word"] for w in run) == want:
+                    best = max(best, min(float(w.get("conf", 1.0)) for w in run))
+        return best
+
+    def check(self, audio: np.ndarray) -> bool:
+        if not self.enabled:
+            return True
+        if time.monotonic() < self.open_until:
+            self.stats["followups"] += 1
+            return True
+        self.load()
+        if not self.model:
+            return True
+        t0 = time.thread_time()
+        conf = self.spot(audio)
+        self.stats["cpu_s"] += time.thread_time() - t0
+        self.stats["checked_s"] += min(len(audio) / SAMPLE_RATE, WAKE_WINDOW_SECONDS)
+        if conf >= self.min_conf:
+            self.stats["passed"] += 1
+            self.keep_open()
+            return True
+        self.stats["rejected"] += 1
+        print(f"[Wake] ignored a phrase without the wake word (conf {conf:.2f})")
+        return False
+
+
+WAKE_GATE = WakeGate()
+
+
+def strip_wake_word(text: str) -> str:
+    """Drop a leading wake word from the transcript ("Ainek, open YouTube" -> "open YouTube")."""
+    for want in WAKE_GATE.words:
+        m = re.match(r"\s*(hey\s+)?" + r"\W+".join(map(re.escape, want.split())) + r"\b[\s,.!?]*", text, re.I)
+        if m and text[m.end():].strip():
+            return text[m.end():]
+    return text
+
+
+# ---- Streaming STT ----
+_stream_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt-stream")
+
+
+def _common_prefix_words(a: str, b: str) -> str:
+    out = []
+    for x, y in zip(a.split(), b.split()):
+        if x != y:
+            break
+        out.append(x)
+    return " ".join(out)
+
+
+class StreamingTranscriber:
+    """
+    Incremental decoding of one phrase while it is still being spoken.
+
+    Every STREAM_STEP_SECONDS of new audio (or as soon as the speaker pauses for
+    STREAM_PAUSE_SECONDS) the uncommitted tail is re-decoded on a background
+    thread. Segments that come out identical in two consecutive hypotheses, and
+    are not the last still-growing one, are committed: their text is frozen and
+    their audio leaves the decode window. finish() then only has to decode the
+    short uncommitted tail, and usually not even that, because the pause decode
+    already covered every voiced sample. Once settled() says so, listen_loop
+    ends the phrase after STREAM_HANGOVER_MS of silence instead of waiting
+    out the full VAD_HANGOVER_MS.
+    """
+
+    def __init__(self, on_partial=None):
+        self._buf = np.empty(int(SAMPLE_RATE * MAX_RECORD_SECONDS) + 8 * BLOCK_SIZE, dtype=np.float32)
+        self._n = 0             # samples written
+        self._voiced_end = 0    # sample just past the last voiced block
+        self._committed = 0     # samples whose text is frozen in _committed_text
+        self._committed_text = []
+        self._snap_end = 0      # end of the most recently scheduled decode window
+        self._hyp_end = 0       # end of the most recently finished decode window
+        self._segments = []     # last hypothesis for the tail, times relative to _committed
+        self._tail_text = ""
+        self._pending = None
+        self._lock = threading.Lock()
+        self._on_partial = on_partial
+        self._step = int(STREAM_STEP_SECONDS * SAMPLE_RATE)
+        self._pause = int(STREAM_PAUSE_SECONDS * SAMPLE_RATE)
+
+    def feed(self, block: np.ndarray, voiced: bool):
+        n = min(len(block), len(self._buf) - self._n)
+        if n <= 0:
+            return
+        # region [0:_n) is append-only, so decode windows can be views of it
+        self._buf[self._n:self._n + n] = block[:n]
+        self._n += n
+        if voiced:
+            self._voiced_end = self._n
+        self._maybe_schedule()
+
+    def _maybe_schedule(self):
+        if self._pending is not None and not self._pending.done():
+            return
+        if not self._voiced_end or self._voiced_end + self._pause <= self._snap_end:
+            return  # nothing voiced since the last window
+        paused = self._n - self._voiced_end >= self._pause
+        if paused or self._n - self._snap_end >= self._step:
+            start, end = self._committed, self._n
+            prompt = " ".join(self._committed_text) or None
+            self._snap_end = end
+            self._pending = _stream_pool.submit(self._decode, start, end, prompt)
+
+    def _decode(self, start: int, end: int, prompt):
+        segs = get_stt().decode(self._buf[start:end], initial_prompt=prompt)
+        with self._lock:
+            prev = self._segments
+            k = 0
+            while k < len(segs) - 1 and k < len(prev) and segs[k][2] == prev[k][2]:
+                k += 1
+            if k:
+                shift = segs[k - 1][1]
+                self._committed_text.extend(t for _, _, t in segs[:k] if t)
+                self._committed = min(start + int(shift * SAMPLE_RATE), end)
+                segs = [(a - shift, b - shift, t) for a, b, t in segs[k:]]
+            old_tail = self._tail_text
+            self._segments = segs
+            self._tail_text = " ".join(t for _, _, t in segs if t)
+            self._hyp_end = end
+            committed = " ".join(self._committed_text)
+            stable = " ".join(x for x in (committed, _common_prefix_words(old_tail, self._tail_text)) if x)
+            full = " ".join(x for x in (committed, self._tail_text) if x)
+        if self._on_partial:
+            self._on_partial(stable, full[len(stable):].strip())
+
+    def settled(self) -> bool:
+        """The last decode has finished and covered every voiced sample, so finish() costs nothing."""
+        pending = self._pending
+        if pending is not None and not pending.done():
+            return False
+        with self._lock:
+            return self._voiced_end > 0 and self._hyp_end >= min(self._n, self._voiced_end + self._pause)
+
+    def finish(self) -> str:
+        """Final transcript; decodes only the part no hypothesis has covered yet."""
+        pending = self._pending
+        if pending is not None:
+            try:
+                pending.result()
+            except Exception as e:
+                print(f"[STT] streaming decode failed: {e}")
+        with self._lock:
+            start = self._committed
+            covered = self._hyp_end >= min(self._n, self._voiced_end + self._pause)
+            if covered and self._hyp_end > start:
+                tail = self._tail_text
+            else:
+                end = min(self._n, self._voiced_end + self._pause)
+                tail = transcribe(self._buf[start:end]) if end > start else ""
+            return " ".join(x for x in (*self._committed_text, tail) if x).strip()
+
+
+def _print_partial(stable: str, tentative: str):
+    with MUTEX:
+        print(f"User (partial): {stable}" + (f" [{tentative}]" if tentative else ""))
+
+
+# ---- TTS: one persistent engine, sentence-chunked synthesis -> playback ----
+_SENTENCE_RE = re.compile(r"(?<=[^\d][.!?])\s+|\n+")  # not after list numbers like "1."
+_tts_pending = 0     # sentences queued but not yet played; SPEECH_ACTIVE while > 0
+_tts_generation = 0  # bumped by interrupt_tts(); older queued audio is discarded
+_playback_ref = None # (float32 pcm, rate, monotonic start) of the sentence being played
+
+
+def split_sentences(text: str) -> list:
+    return [p.strip() for p in _SENTENCE_RE.split(text or "") if p and p.strip()]
+
+
+class TTSEngine:
+    """
+    A speech engine created once per worker thread and reused for every reply.
+
+    render() synthesizes one sentence to int16 PCM so the speaker can play it
+    while the next sentence is being synthesized. Drivers that can't render
+    (e.g. pyttsx3 on macOS writes AIFF) fall back to say(), which speaks directly.
+    """
+
+    def __init__(self):
+        self.can_render = True
+        if HAS_SAPI:
+            try:
+                import pythoncom
+                pythoncom.CoInitialize()  # COM apartment for this worker thread
+            except Exception:
+                pass
+            self.kind = "sapi"
+            self._voice = wincl.Dispatch("SAPI.SpVoice")
+            self._direct = None
+        else:
+            self.kind = "pyttsx3"
+            self._eng = pyttsx3.init()
+
+    def cache_key(self, text: str) -> tuple:
         try:
-            os.unlink(tmp_path)
+            if HAS_SAPI:
+                voice, rate = self._voice.Voice.Id, self._voice.Rate
+            else:
+                voice, rate = self._eng.getProperty("voice"), self._eng.getProperty("rate")
         except Exception:
-            pass
+            voice, rate = None, None
+        return (self.kind, str(voice), str(rate), text)
+
+    def render(self, text: str):
+        if not self.can_render:
+            return None
+        try:
+            return self._render_sapi(text) if HAS_SAPI else self._render_pyttsx3(text)
+        except Exception as e:
+            print(f"[TTS] can't render to memory ({e}); speaking directly from now on")
+            self.can_render = False
+            return None
 
+    def _render_sapi(self, text: str):
+        stream = wincl.Dispatch("SAPI.SpMemoryStream")
+        stream.Format.Type = 22  # SAFT22kHz16BitMono
+        self._voice.AudioOutputStream = stream
+        self._voice.Speak(text)
+        return np.frombuffer(bytes(stream.GetData()), dtype=np.int16), 22050
 
-# ---- TTS worker ----
-def _speak_once(text: str):
-    if not text:
-        return
-    if HAS_SAPI:
-        voice = wincl.Dispatch("SAPI.SpVoice")
-        voice.Speak(text)
-    else:
-        eng = pyttsx3.init()
+    def _render_pyttsx3(self, text: str):
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
         try:
-            eng.say(text)
-            eng.runAndWait()
+            self._eng.save_to_file(text, path)
+            self._eng.runAndWait()
+            with wave.open(path, "rb") as wf:
+                if wf.getsampwidth() != 2:
+                    raise ValueError("expected 16-bit PCM")
+                pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+                if wf.getnchannels() > 1:
+                    pcm = pcm.reshape(-1, wf.getnchannels())[:, 0].copy()
+                return pcm, wf.getframerate()
         finally:
             try:
-                eng.stop()
+                os.unlink(path)
+            except Exception:
+                pass
+
+    def say(self, text: str):
+        if HAS_SAPI:
+            if self._direct is None:
+                self._direct = wincl.Dispatch("SAPI.SpVoice")
+            self._direct.Speak(text)
+        else:
+            self._eng.say(text)
+            self._eng.runAndWait()
+
+
+class AudioCache:
+    """
+    LRU cache of rendered sentences keyed by (engine, voice, rate, text).
+
+    The memory tier holds up to mem_mb of PCM. Every entry is also written to
+    disk_dir as a WAV named by the key's hash, so confirmations survive a
+    restart. The disk tier drops least-recently-used files (by mtime) once it
+    exceeds disk_mb.
+    """
+
+    def __init__(self, mem_mb=TTS_CACHE_MB, disk_dir=TTS_CACHE_DIR, disk_mb=TTS_CACHE_DISK_MB):
+        self.mem_budget = int(mem_mb * 2**20)
+        self.disk_budget = int(disk_mb * 2**20)
+        self.disk_dir = disk_dir
+        self.stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0}
+        self._mem = OrderedDict()
+        self._mem_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+    def _path(self, key) -> str:
+        digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, digest + ".wav")
+
+    def get(self, key):
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                self.stats["mem_hits"] += 1
+                return hit
+        path = self._path(key) if self.disk_budget else None
+        if path and os.path.exists(path):
+            try:
+                with wave.open(path, "rb") as wf:
+                    pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+                    item = (pcm, wf.getframerate())
+                os.utime(path)  # LRU order for the disk tier
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                    self._remember(key, item)
+                return item
             except Exception:
                 pass
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, pcm: np.ndarray, rate: int):
+        item = (pcm, rate)
+        with self._lock:
+            self._remember(key, item)
+        if self.disk_budget:
+            try:
+                self._write_disk(key, pcm, rate)
+            except Exception as e:
+                print(f"[TTS] cache write failed: {e}")
+
+    def _remember(self, key, item):
+        if key in self._mem:
+            self._mem_bytes -= self._mem.pop(key)[0].nbytes
+        self._mem[key] = item
+        self._mem_bytes += item[0].nbytes
+        while self._mem_bytes > self.mem_budget and len(self._mem) > 1:
+            _, old = self._mem.popitem(last=False)
+            self._mem_bytes -= old[0].nbytes
+
+    def _write_disk(self, key, pcm, rate):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+        os.close(fd)
+        with wave.open(tmp, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(rate)
+            wf.writeframes(pcm.astype(np.int16).tobytes())
+        os.replace(tmp, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(e.stat().st_size for e in os.scandir(self.disk_dir) if e.name.endswith(".wav"))
+            else:
+                self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes <= self.disk_budget:
+                return
+            files = sorted((e for e in os.scandir(self.disk_dir) if e.name.endswith(".wav")),
+                           key=lambda e: e.stat().st_mtime)
+            for e in files:
+                if self._disk_bytes <= self.disk_budget * 0.9:
+                    break
+                try:
+                    size = e.stat().st_size
+                    os.unlink(e.path)
+                    self._disk_bytes -= size
+                except OSError:
+                    pass
+
+
+TTS_CACHE = AudioCache()
+
+
+def _render_cached(engine: TTSEngine, text: str):
+    key = engine.cache_key(text)
+    rendered = TTS_CACHE.get(key)
+    if rendered is None:
+        rendered = engine.render(text)
+        if rendered is not None and len(rendered[0]):
+            TTS_CACHE.put(key, *rendered)
+    return rendered
+
+
+def _prewarm_tts(engine: TTSEngine):
+    if not TTS_PREWARM:
+        return
+    t0 = time.time()
+    for phrase in TTS_PREWARM:
+        for sentence in split_sentences(phrase):
+            if _render_cached(engine, sentence) is None:
+                return  # engine can't render; nothing to cache
+    print(f"[TTS] {len(TTS_PREWARM)} phrases cached ({time.time() - t0:.1f}s)")
+
+
+def _tts_done():
+    global _tts_pending
+    with MUTEX:
+        _tts_pending = max(0, _tts_pending - 1)
+        if not _tts_pending:
+            SPEECH_ACTIVE.clear()
+            WAKE_GATE.keep_open()  # follow-up window starts when the reply finishes
 
 
 def tts_worker():
+    engine = None
+    try:
+        if TTS_ENABLED:
+            engine = TTSEngine()
+            _prewarm_tts(engine)
+    except Exception as e:
+        print(f"[TTS] engine init failed, will retry: {e}")
     while True:
-        text = tts_q.get()
-        if text is None:
-            break
-        SPEECH_ACTIVE.set()
+        item = tts_q.get()
+        trace = None
         try:
-            _speak_once(text)
+            if item is None:
+                play_q.put(None)
+                break
+            gen, text, trace, queued_at = item
+            if gen != _tts_generation:
+                if trace:
+                    trace.finish(no_audio="interrupted")
+                _tts_done()
+                continue
+            if trace:
+                trace.add("tts_wait", (time.monotonic() - queued_at) * 1000.0)
+                synth_done = trace.timer("synth")
+            if engine is None:
+                engine = TTSEngine()
+            rendered = _render_cached(engine, text)
+            if trace:
+                synth_done()
+            if rendered is None:
+                play_q.join()  # let queued audio finish before speaking over it
+                if trace:
+                    trace.add("first_audio", (time.monotonic() - trace.t0) * 1000.0)
+                    trace.finish()
+                engine.say(text)
+                _tts_done()
+            elif len(rendered[0]):
+                play_q.put((gen, *rendered, trace))  # blocks while the speaker is a sentence behind
+            else:
+                if trace:
+                    trace.finish(no_audio="empty render")
+                _tts_done()
+        except Exception as e:
+            print(f"[TTS] failed: {e}")
+            if trace:
+                trace.finish(no_audio=f"tts failed: {e.__class__.__name__}")
+            _tts_done()
         finally:
-            SPEECH_ACTIVE.clear()
             tts_q.task_done()
 
 
-def speak(text: str):
-    if text:
-        tts_q.put(text)
+def playback_worker():
+    global _playback_ref
+    while True:
+        item = play_q.get()
+        trace = None
+        try:
+            if item is None:
+                break
+            gen, pcm, rate, trace = item
+            if gen != _tts_generation:
+                if trace:
+                    trace.finish(no_audio="interrupted")
+                continue
+            _playback_ref = (pcm.astype(np.float32) / 32768.0, rate, time.monotonic())
+            if trace:
+                trace.add("first_audio", (_playback_ref[2] - trace.t0) * 1000.0)
+                trace.finish()
+            sd.play(pcm, rate)
+            sd.wait()
+        except Exception as e:
+            print(f"[TTS] playback failed: {e}")
+            if trace:
+                trace.finish(no_audio=f"playback failed: {e.__class__.__name__}")  # no-op if first_audio was written
+        finally:
+            _playback_ref = None
+            if item is not None:
+                _tts_done()
+            play_q.task_done()
+
+
+def speak(text: str, generation: int = None, trace: PhraseTrace = None):
+    """
+    Queue a reply sentence by sentence, so the first one plays while the rest
+    synthesize. Replies started before the last barge-in (older generation)
+    are dropped. Only the phrase's first sentence carries its trace.
+    """
+    global _tts_pending
+    gen = _tts_generation if generation is None else generation
+    if gen != _tts_generation or not TTS_ENABLED:
+        return
+    for sentence in split_sentences(text):
+        with MUTEX:
+            _tts_pending += 1
+            SPEECH_ACTIVE.set()
+        first = None
+        if trace is not None and not trace.queued:
+            first, trace.queued = trace, True
+        tts_q.put((gen, sentence, first, time.monotonic()))
 
 
-# ---- Backend call + orchestration ----
-def handle_phrase(audio: np.ndarray):
-    import requests
+def interrupt_tts():
+    """Stop playback now and drop every queued sentence."""
+    global _tts_generation
+    with MUTEX:
+        _tts_generation += 1
+    for q in (tts_q, play_q):
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:  # shutting down; leave the sentinel in place
+                q.task_done()
+                q.put_nowait(None)
+                break
+            trace = item[2] if q is tts_q else item[-1]
+            if trace:
+                trace.finish(no_audio="interrupted")
+            _tts_done()
+            q.task_done()
+    try:
+        sd.stop()
+    except Exception:
+        pass
+    SPEECH_ACTIVE.clear()
 
-    wav_bytes = io.BytesIO()
-    with wave.open(wav_bytes, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes((audio * 32767).astype(np.int16).tobytes())
-    wav_bytes.seek(0)
 
-    text = transcribe(wav_bytes.read())
-    if not text:
-        return
-    print("User:", text)
+def _playback_ref_rms(lag_s: float) -> float:
+    """RMS of what the speaker was playing around lag_s seconds ago (0 if silent)."""
+    ref = _playback_ref
+    if ref is None:
+        return 0.0
+    pcm, rate, t0 = ref
+    t = time.monotonic() - lag_s - t0
+    block_s = BLOCK_SIZE / SAMPLE_RATE
+    # widen the window: output latency and acoustic delay aren't known exactly
+    lo = max(0, int((t - block_s - 0.1) * rate))
+    hi = min(len(pcm), int((t + 0.1) * rate))
+    if hi <= lo:
+        return 0.0
+    return _rms(pcm[lo:hi])
+
+
+class BargeInDetector:
+    """
+    Tells the user's voice apart from our own TTS leaking into the mic.
+
+    The echo gain (mic RMS / playback RMS) is learned while we speak: it
+    follows drops quickly and rises slowly, so a burst of the user's voice
+    barely moves it. A block is a barge-in candidate when the mic is louder
+    than BARGE_IN_MARGIN x the expected echo and BARGE_IN_MIN_RMS; the
+    candidates must last BARGE_IN_ONSET_MS.
+    """
+
+    def __init__(self):
+        self.gain = None
+        self.onset_blocks = max(1, int(round(BARGE_IN_ONSET_MS / 1000 * SAMPLE_RATE / BLOCK_SIZE)))
+        self._run = 0
+
+    def reset(self):
+        self._run = 0
+
+    def process(self, block: np.ndarray, ref_rms: float) -> bool:
+        mic = _rms(block)
+        if ref_rms > 1e-4:
+            g = mic / ref_rms
+            if self.gain is None:
+                self.gain = g
+            else:
+                self.gain += (0.5 if g < self.gain else 0.02) * (g - self.gain)
+        expected = (self.gain or 0.0) * ref_rms
+        if mic > max(BARGE_IN_MARGIN * expected, BARGE_IN_MIN_RMS):
+            self._run += 1
+        else:
+            self._run = 0
+        return self._run >= self.onset_blocks
+
+
+# ---- Backend call ----
+_http = None
+_stream_supported = True
+
+
+def _http_session():
+    """One keep-alive session for every /api call (only backend_worker uses it)."""
+    global _http
+    if _http is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        sess = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4)
+        sess.mount("http://", adapter)
+        sess.mount("https://", adapter)
+        sess.headers["Content-Type"] = "application/json"
+        if API_KEY:
+            sess.headers["X-API-Key"] = API_KEY
+        _http = sess
+    return _http
+
+
+def _reply_from_json(j: dict) -> str:
+    return j.get("summary") or j.get("message") or "Okay."
+
+
+def ask_backend(text: str) -> str:
+    try:
+        r = _http_session().post(f"{API_BASE}/api/open", json={"prompt": text}, timeout=BACKEND_TIMEOUT)
+        r.raise_for_status()
+        return _reply_from_json(r.json())
+    except Exception as e:
+        return f"Error talking to backend: {e}"
+
+
+def _iter_sse(resp):
+    """(event, data) pairs from a text/event-stream response, as they arrive."""
+    resp.encoding = "utf-8"
+    event, data = "message", []
+    for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+    if data:
+        yield event, "\n".join(data)
+
+
+def ask_backend_stream(text: str, on_sentence) -> str:
+    """
+    POST to /api/open/stream and hand each finished sentence of the reply to
+    on_sentence while the backend is still generating the rest.
 
-    headers = {"Content-Type": "application/json"}
-    if API_KEY:
-        headers["X-API-Key"] = API_KEY
+    Events: "delta" {"text": ...} carries reply text; "done" carries the same
+    JSON /api/open would return. If no deltas came (non-chat intents) the
+    final JSON is spoken as usual. Falls back to /api/open on a 404.
+    """
+    global _stream_supported
+    if not _stream_supported:
+        reply = ask_backend(text)
+        on_sentence(reply)
+        return reply
     try:
-        r = requests.post(
-            f"{API_BASE}/api/open", headers=headers, json={"prompt": text}, timeout=60
+        r = _http_session().post(
+            f"{API_BASE}/api/open/stream", json={"prompt": text}, stream=True,
+            timeout=BACKEND_TIMEOUT, headers={"Accept": "text/event-stream"},
         )
+        if r.status_code == 404:
+            r.close()
+            _stream_supported = False
+            print("[Backend] no /api/open/stream; using /api/open")
+            return ask_backend_stream(text, on_sentence)
         r.raise_for_status()
-        j = r.json()
-        reply = j.get("summary") or j.get("message") or "Okay."
+        streamed, pending, final = [], "", None
+        with r:
+            for event, data in _iter_sse(r):
+                payload = json.loads(data) if data else {}
+                if event == "delta":
+                    pending += payload.get("text", "")
+                    cut = None
+                    for m in _SENTENCE_RE.finditer(pending):
+                        cut = m
+                    if cut is not None:
+                        done, pending = pending[:cut.start()], pending[cut.end():]
+                        streamed.append(done)
+                        on_sentence(done)
+                elif event == "done":
+                    final = payload
+        if streamed or pending.strip():
+            if pending.strip():
+                streamed.append(pending)
+                on_sentence(pending)
+            return " ".join(x.strip() for x in streamed)
+        reply = _reply_from_json(final or {})
+        on_sentence(reply)
+        return reply
     except Exception as e:
         reply = f"Error talking to backend: {e}"
+        on_sentence(reply)
+        return reply
+
+
+# ---- Pipeline: capture -> segmentation -> STT -> backend -> TTS ----
+# Capture is the PortAudio callback, segmentation is listen_loop, TTS is
+# tts_worker; STT and the backend call get a worker each. Segmentation never
+# blocks: if STT is behind, the oldest queued phrase is dropped as stale.
+# Later stages block on a full queue, which backs pressure up to phrase_q.
+def _put_drop_oldest(q: queue.Queue, item):
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                stale = q.get_nowait()
+                q.task_done()
+                if stale is not None and stale[0] is not None:
+                    stale[0].finish(no_audio="dropped")
+                PIPELINE_STATS["phrases_dropped"] += 1
+                print("[Pipeline] STT is behind; dropped a stale phrase")
+            except queue.Empty:
+                pass
+
+
+def submit_phrase(item, trace: PhraseTrace = None):
+    """Hand a finished phrase (float32 array or StreamingTranscriber) to STT."""
+    _put_drop_oldest(phrase_q, (trace or PhraseTrace(), item))
+
+
+def _stt_stage(item) -> str:
+    if isinstance(item, StreamingTranscriber):
+        return item.finish()
+    return transcribe(item)
+
+
+def _trim_stage(audio: np.ndarray) -> np.ndarray:
+    trimmed = trim_silence(audio)
+    before, saved = len(audio) / SAMPLE_RATE, (len(audio) - len(trimmed)) / SAMPLE_RATE
+    PIPELINE_STATS["trim_in_s"] += before
+    PIPELINE_STATS["trim_saved_s"] += saved
+    if saved > 0:
+        print(f"[Trim] {before:.1f}s -> {before - saved:.1f}s (saved {saved:.1f}s of silence)")
+    return trimmed
+
+
+def stt_worker():
+    while True:
+        item = phrase_q.get()
+        trace = None
+        try:
+            if item is None:
+                text_q.put(None)
+                break
+            trace, phrase = item
+            if not isinstance(phrase, StreamingTranscriber):  # streamed phrases are gated in listen_loop
+                trim_done = trace.timer("trim")
+                phrase = _trim_stage(phrase)
+                trim_done()
+                wake_done = trace.timer("wake")
+                passed = WAKE_GATE.check(phrase)
+                wake_done()
+                if not passed:
+                    trace.finish()
+                    continue
+            if not get_stt().ready:
+                print("[STT] model still loading; this phrase will be transcribed when it is ready")
+            stt_done = trace.timer("stt")
+            text = strip_wake_word(_stt_stage(phrase))
+            stt_done()
+            if text:
+                print("User:", text)
+                text_q.put((trace, text))
+            else:
+                trace.finish()
+        except Exception as e:
+            print(f"[STT] failed: {e}")
+            if trace:
+                trace.finish(no_audio=f"stt failed: {e.__class__.__name__}")
+        finally:
+            phrase_q.task_done()
+
+
+def backend_worker():
+    while True:
+        item = text_q.get()
+        try:
+            if item is None:
+                break
+            trace, text = item
+            gen = _tts_generation  # a barge-in during this reply silences the rest of it
+            backend_done = trace.timer("backend")
+            if BACKEND_STREAM:
+                def on_sentence(sentence):
+                    backend_done()  # first speakable text
+                    speak(sentence, gen, trace)
+                reply = ask_backend_stream(text, on_sentence=on_sentence)
+            else:
+                reply = ask_backend(text)
+                backend_done()
+                speak(reply, gen, trace)
+            if not trace.queued:  # nothing to say (or barged in): record what we have
+                trace.finish()
+            WAKE_GATE.keep_open()
+            print("Ainek:", reply)
+        finally:
+            text_q.task_done()
 
-    print("Ainek:", reply)
-    speak(reply)
+
+def start_pipeline():
+    workers = [
+        threading.Thread(target=tts_worker, name="tts", daemon=True),
+        threading.Thread(target=backend_worker, name="backend", daemon=True),
+        threading.Thread(target=stt_worker, name="stt", daemon=True),
+        threading.Thread(target=playback_worker, name="playback", daemon=True),
+    ]
+    for w in workers:
+        w.start()
+    return workers
+
+
+def stop_pipeline(workers, timeout: float = 2.0):
+    _put_drop_oldest(phrase_q, None)
+    workers[1].join(timeout=timeout)  # backend drains after STT forwards the sentinel
+    tts_q.put(None)
+    for w in workers:
+        w.join(timeout=timeout)
 
 
 # ---- Hotkey (Shift+1) to toggle mute ----
@@ -215,52 +1731,133 @@ def hotkey_worker():
 
 
 # ---- Mic listen loop ----
-def listen_loop():
-    with sd.InputStream(
-        callback=_audio_cb,
-        channels=1,
-        samplerate=SAMPLE_RATE,
-        blocksize=BLOCK_SIZE,
-        dtype="float32",
-    ):
-        print("Ainek is always listening... speak any time. (Shift+1 to mute/unmute)")
-        buf, speaking, last_voice = [], False, time.time()
+def listen_loop(source=None):
+    """Segment the mic (or a ReplaySource) into phrases until the source runs out."""
+    if source is None:
+        if sd is None:
+            raise RuntimeError("sounddevice/PortAudio is not available; no microphone input")
+        source = sd.InputStream(
+            callback=_audio_cb,
+            channels=1,
+            samplerate=SAMPLE_RATE,
+            blocksize=BLOCK_SIZE,
+            dtype="float32",
+        )
+    with source:
+        if not isinstance(source, ReplaySource):
+            print("Ainek is always listening... speak any time. (Shift+1 to mute/unmute)")
+        ring = AUDIO_RING
+        seg = Segmenter()
+        barge = BargeInDetector() if BARGE_IN else None
+        stream, phrase_start, dropped = None, None, ring.dropped
+        wake_ok, wake_ms, wake_window = None, 0.0, int(WAKE_WINDOW_SECONDS * SAMPLE_RATE)
+        stream_hangover = int(STREAM_HANGOVER_MS * SAMPLE_RATE / 1000)
+        last_voiced, last_voiced_pos = None, 0
+        preroll = (seg.preroll_blocks - 1) * BLOCK_SIZE
         while True:
-            block = audio_q.get().squeeze()
-
-            # If TTS is speaking, drop any buffered input.
-            if SPEECH_ACTIVE.is_set():
-                buf, speaking = [], False
+            pos = ring.read_pos
+            block = ring.read(BLOCK_SIZE, timeout=0.5)
+            if block is None:
+                if getattr(source, "exhausted", False):
+                    break
                 continue
 
-            # If mic is muted, keep draining but ignore audio; also clear any partial buffer.
-            if MIC_MUTED.is_set():
-                if buf or speaking:
-                    buf, speaking = [], False
+            if ring.dropped != dropped:
+                print(f"[Audio] ring overflow ({ring.policy}): {ring.dropped - dropped} samples dropped, "
+                      f"{ring.dropped} total")
+                dropped = ring.dropped
+
+            # If TTS is speaking or the mic is muted, ignore audio and clear any partial phrase,
+            # unless barge-in is on and the user is talking over the assistant.
+            if SPEECH_ACTIVE.is_set() or MIC_MUTED.is_set():
+                if seg.speaking:
+                    seg.reset()
+                    ring.release()
+                    stream = None
+                lag = (ring.write_pos - ring.read_pos) / SAMPLE_RATE
+                if (barge is None or MIC_MUTED.is_set()
+                        or not barge.process(block, _playback_ref_rms(lag))):
+                    continue
+                interrupt_tts()
+                print("[Barge-in] stopped speaking; listening")
+                seg.force_start()
+                event = "start"
+                back = preroll + barge.onset_blocks * BLOCK_SIZE
+                barge.reset()
+            else:
+                if barge is not None:
+                    barge.reset()
+                event = seg.push(block)
+                back = preroll
+
+            if event == "start":
+                phrase_start = ring.hold(pos - back)
+                wake_ok = None
+            elif event is None and not seg.speaking:
                 continue
 
-            buf.append(block)
-            if _rms(block) > SILENCE_THRESHOLD:
-                speaking = True
-                last_voice = time.time()
+            if seg.voiced:
+                # capture time of this block's last sample: now minus what is still queued behind it
+                last_voiced = time.monotonic() - (ring.write_pos - ring.read_pos) / SAMPLE_RATE
+                last_voiced_pos = ring.read_pos
+
+            if STT_STREAMING:
+                # decide the wake word before any streaming decode is spent on the phrase
+                if wake_ok is None and (event == "end" or ring.read_pos - phrase_start >= wake_window
+                                        or not WAKE_GATE.enabled):
+                    t_wake = time.monotonic()
+                    wake_ok = WAKE_GATE.check(ring.extract(phrase_start, ring.read_pos))
+                    wake_ms = (time.monotonic() - t_wake) * 1000.0
+                if wake_ok and stream is None:
+                    stream = StreamingTranscriber(on_partial=_print_partial)
+                    stream.feed(ring.extract(phrase_start, pos), False)
+                if stream is not None:
+                    stream.feed(block, seg.voiced)
+                    # the pause decode already holds the whole phrase: end it now rather than after the full hangover
+                    if (event is None and seg.speaking and not seg.voiced
+                            and ring.read_pos - last_voiced_pos >= stream_hangover and stream.settled()):
+                        event = seg.end_now()
 
-            timed_out = time.time() - last_voice > 1.5
-            too_long = len(buf) > SAMPLE_RATE * MAX_RECORD_SECONDS / BLOCK_SIZE
-            if speaking and (timed_out or too_long):
-                audio = np.concatenate(buf)
-                handle_phrase(audio)
-                buf, speaking = [], False
+            if event == "end":
+                trace = PhraseTrace(last_voiced)
+                trace.add("eos", (time.monotonic() - trace.t0) * 1000.0)
+                trace.audio = (phrase_start, ring.read_pos, last_voiced_pos)
+                if STT_STREAMING:
+                    trace.add("wake", wake_ms)
+                if STT_STREAMING and not wake_ok:
+                    trace.finish()
+                elif stream is not None:
+                    submit_phrase(stream, trace)
+                else:
+                    extract_done = trace.timer("extract")
+                    audio = ring.extract(phrase_start, ring.read_pos)
+                    extract_done()
+                    submit_phrase(audio, trace)
+                ring.release()
+                stream = None
 
 
 if __name__ == "__main__":
-    t = threading.Thread(target=tts_worker, daemon=True)
-    t.start()
+    ap = argparse.ArgumentParser(description="Ainek voice daemon")
+    ap.add_argument("--metrics-summary", nargs="?", const=METRICS_PATH, metavar="PATH",
+                    help="print latency percentiles from a metrics file and exit")
+    args = ap.parse_args()
+    if args.metrics_summary:
+        print_metrics_summary(args.metrics_summary)
+        raise SystemExit(0)
+    if STT_ENGINE not in STT_ENGINES:
+        # fail here, not in the preload thread or mid-phrase in listen_loop
+        raise SystemExit(f"unknown STT_ENGINE {STT_ENGINE!r}; choose from {', '.join(STT_ENGINES)}")
+
+    start_stt_preload()
+    workers = start_pipeline()
 
     hk = threading.Thread(target=hotkey_worker, daemon=True)
     hk.start()
+    threading.Thread(target=metrics_worker, daemon=True).start()
 
     try:
         listen_loop()
     finally:
-        tts_q.put(None)
-        t.join(timeout=2)
+        METRICS.dump()
+        stop_pipeline(workers)
@@ -13,9 +13,11 @@ export default function Landing({ apiBase = "http://127.0.0.1:5003", apiKey = nu
   const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [streamText, setStreamText] = useState("");
 
   const autoStickRef = useRef(true);
   const lastIdRef = useRef(null);
+  const lastSeqRef = useRef(null);
   const [showJump, setShowJump] = useState(false);
 
   const composerRef = useRef(null);
@@ -81,9 +83,17 @@ export default function Landing({ apiBase = "http://127.0.0.1:5003", apiKey = nu
     try {
       const headers = {};
       if (apiKey) headers["X-API-Key"] = apiKey;
-      const res = await fetch(`${base}/api/history`, { headers });
+      // first poll gets the newest page, later polls only what came after it
+      const since = lastSeqRef.current;
+      const url = since == null ? `${base}/api/history` : `${base}/api/history?since=${since}`;
+      const res = await fetch(url, { headers });
       const data = await res.json();
-      if (Array.isArray(data)) setHistory(data);
+      if (!Array.isArray(data) || !data.length) return;
+      // the server flags a cursor it no longer knows (e.g. history cleared); seqs going backwards mean the same
+      const restarted =
+        since != null && (res.headers.get("X-History-Reset") === "1" || (data[0].seq != null && data[0].seq <= since));
+      lastSeqRef.current = data[data.length - 1].seq ?? null;
+      setHistory((h) => (since == null || restarted || lastSeqRef.current == null ? data : [...h, ...data]));
     } catch {}
   }, [base, apiKey]);
 
@@ -97,6 +107,55 @@ export default function Landing({ apiBase = "http://127.0.0.1:5003", apiKey = nu
     return () => timer && clearInterval(timer);
   }, [fetchHistory]);
 
+  // POST to /api/open/stream and show the reply while it is generated.
+  // Resolves to the final /api/open JSON; falls back to /api/open if there is no stream endpoint.
+  async function postPrompt(text, headers) {
+    const body = JSON.stringify({ prompt: text });
+    const res = await fetch(`${base}/api/open/stream`, { method: "POST", headers, body });
+    if (res.status === 404 || !res.body) {
+      const plain = await fetch(`${base}/api/open`, { method: "POST", headers, body });
+      const data = await plain.json();
+      if (!plain.ok) throw new Error(data?.message || data?.error || "Request failed");
+      return data;
+    }
+    if (!res.ok) {
+      const data = await res.json().catch(() => ({}));
+      throw new Error(data?.message || data?.error || "Request failed");
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let final = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const chunk = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = "message";
+        const data = [];
+        for (const line of chunk.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data.push(line.slice(5).trimStart());
+        }
+        if (!data.length) continue;
+        const payload = JSON.parse(data.join("\n"));
+        if (event === "delta") {
+          setStreamText((t) => t + (payload.text || ""));
+          if (autoStickRef.current) scrollToBottom(false);
+        } else if (event === "done") {
+          final = payload;
+        }
+      }
+    }
+    if (!final) throw new Error("Stream ended early");
+    if (!final.ok) throw new Error(final.message || final.error || "Request failed");
+    return final;
+  }
+
   async function sendPrompt(textOverride = null) {
     const text = (textOverride || prompt).trim();
     if (!text) return;
@@ -109,15 +168,7 @@ export default function Landing({ apiBase = "http://127.0.0.1:5003", apiKey = nu
       const headers = { "Content-Type": "application/json" };
       if (apiKey) headers["X-API-Key"] = apiKey;
 
-      const res = await fetch(`${base}/api/open`, {
-        method: "POST",
-        headers,
-        body: JSON.stringify({ prompt: text }),
-      });
-
-      await res.json();
-      if (!res.ok) throw new Error("Request failed");
-
+      await postPrompt(text, headers);
       await fetchHistory();
 
       autoStickRef.current = true;
@@ -134,6 +185,7 @@ export default function Landing({ apiBase = "http://127.0.0.1:5003", apiKey = nu
         },
       ]);
     } finally {
+      setStreamText("");
       setLoading(false);
     }
   }
@@ -156,7 +208,7 @@ export default function Landing({ apiBase = "http://127.0.0.1:5003", apiKey = nu
           {history.map((m) => {
             const isUser = m.sender === "user";
             return (
-              <div key={m.id} className={`flex items-start gap-2 ${isUser ? "justify-end" : "justify-start"}`}>
+              <div key={m.seq ?? m.id} className={`flex items-start gap-2 ${isUser ? "justify-end" : "justify-start"}`}>
                 {!isUser && (
                   <Avatar className="h-8 w-8">
                     <AvatarImage src="/bot-avatar.png" alt="Ainek" />
@@ -196,9 +248,19 @@ export default function Landing({ apiBase = "http://127.0.0.1:5003", apiKey = nu
               <Avatar className="h-8 w-8">
                 <AvatarFallback>A</AvatarFallback>
               </Avatar>
-              <div className="px-3 py-2 rounded-2xl bg-muted text-muted-foreground animate-pulse">
-                Thinking…
-              </div>
+              {streamText ? (
+                <Card className="max-w-[44rem] rounded-2xl shadow-sm bg-secondary text-secondary-foreground rounded-bl-sm">
+                  <CardContent className="px-4 py-2">
+                    <div className="prose prose-sm md:prose-base prose-invert dark:prose-invert">
+                      <ReactMarkdown>{streamText}</ReactMarkdown>
+                    </div>
+                  </CardContent>
+                </Card>
+              ) : (
+                <div className="px-3 py-2 rounded-2xl bg-muted text-muted-foreground animate-pulse">
+                  Thinking…
+                </div>
+              )}
             </div>
           )}
         </div>